@@ -0,0 +1,200 @@
+import asyncio
+import math
+import os
+from collections import deque
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+
+from api.streaming import STREAM_CHUNK_SIZE
+
+# Smallest possible JSON order, {"customer_id":1,"product_id":1,"quantity":1}, so that
+# Content-Length / MIN_JSON_ORDER_BYTES is an upper bound on the orders in a body
+MIN_JSON_ORDER_BYTES = 46
+COLUMNAR_HEADER_BYTES = 8
+COLUMNAR_ORDER_BYTES = 12
+
+
+class AdmissionRejected(Exception):
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[int] = 1):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    # Caps the number of orders being decoded, priced and encoded at once. Requests that do
+    # not fit wait in a bounded FIFO queue for a bounded time; beyond that they are rejected
+    # straight away, 429 when the queue is full and 503 when the wait ran out.
+
+    def __init__(self, max_orders: int, max_waiting: int, max_wait_ms: float):
+        self.max_orders = max_orders
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait_ms / 1000
+        self.in_flight_orders = 0
+        self.in_flight_requests = 0
+        self._waiting = deque()  # [weight, future]
+        self.admitted = 0
+        self.queued = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.rejected_too_large = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_orders > 0
+
+    @property
+    def stream_chunk_size(self) -> int:
+        # Streamed bodies are priced in chunks that fit the budget, so they are always admitted
+        return min(STREAM_CHUNK_SIZE, self.max_orders) if self.enabled else STREAM_CHUNK_SIZE
+
+    async def acquire(self, weight: int):
+        if weight > self.max_orders:
+            self.rejected_too_large += 1
+            raise AdmissionRejected(
+                413, f"Request may hold up to {weight} orders, more than the {self.max_orders} admitted at once", None
+            )
+
+        # Strict FIFO: nobody overtakes a waiting request, so large requests are not starved
+        if not self._waiting and self.in_flight_orders + weight <= self.max_orders:
+            self._admit(weight)
+            return
+
+        if len(self._waiting) >= self.max_waiting:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(429, f"Pricing is at capacity and {len(self._waiting)} requests are already waiting")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [weight, future]
+        self._waiting.append(entry)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                self._waiting.remove(entry)
+                self.rejected_timeout += 1
+                self._wake()
+                raise AdmissionRejected(503, f"Pricing capacity did not free up within {self.max_wait * 1000:.0f}ms")
+        except asyncio.CancelledError:
+            if future.done():
+                # Admitted just as the client went away; hand the capacity back
+                self.release(weight)
+            else:
+                self._waiting.remove(entry)
+                self._wake()
+            raise
+
+    def check_size(self, orders: int):
+        # Called with the real order count once an admitted body has been decoded. Weights are
+        # estimates capped at max_orders, so only the decoded count can show a request that
+        # is too large, with or without Content-Length.
+        if self.enabled and orders > self.max_orders:
+            self.rejected_too_large += 1
+            raise AdmissionRejected(
+                413, f"Request holds {orders} orders, more than the {self.max_orders} admitted at once", None
+            )
+
+    def _admit(self, weight: int):
+        self.in_flight_orders += weight
+        self.in_flight_requests += 1
+        self.admitted += 1
+
+    def release(self, weight: int):
+        self.in_flight_orders -= weight
+        self.in_flight_requests -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiting and self.in_flight_orders + self._waiting[0][0] <= self.max_orders:
+            weight, future = self._waiting.popleft()
+            self._admit(weight)
+            future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_orders": self.max_orders,
+            "in_flight_orders": self.in_flight_orders,
+            "in_flight_requests": self.in_flight_requests,
+            "waiting": len(self._waiting),
+            "max_waiting": self.max_waiting,
+            "max_wait_ms": self.max_wait * 1000,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "rejected_too_large": self.rejected_too_large
+        }
+
+
+def _content_length(scope) -> Optional[int]:
+    for name, value in scope["headers"]:
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+def request_weight(scope, max_orders: int) -> Optional[int]:
+    # Orders a pricing request holds at once, from its path and Content-Length, before its
+    # body is read; None for requests that are not admitted. Body-size estimates are capped at
+    # max_orders, since padding inflates them: oversized requests get their 413 from
+    # AdmissionController.check_size once decoded.
+    if scope["method"] != "POST":
+        return None
+    path = scope["path"]
+    if path in ("/calculate-price", "/quotes"):
+        return 1
+    if path in ("/calculate-bulk-prices/stream", "/calculate-bulk-prices/summary"):
+        # Priced chunk by chunk, whatever the body size; see stream_chunk_size
+        return min(STREAM_CHUNK_SIZE, max_orders)
+    if path in ("/calculate-bulk-prices", "/calculate-bulk-prices/fast"):
+        length = _content_length(scope)
+        # Without a length the size is unknown, so the request runs alone
+        return min(max(math.ceil(length / MIN_JSON_ORDER_BYTES), 1), max_orders) if length is not None else max_orders
+    if path == "/calculate-bulk-prices/columnar":
+        length = _content_length(scope)
+        if length is None:
+            return max_orders
+        return min(max((length - COLUMNAR_HEADER_BYTES) // COLUMNAR_ORDER_BYTES, 1), max_orders)
+    return None
+
+
+class AdmissionMiddleware:
+    # Pure ASGI middleware admitting pricing requests before their bodies are read
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not admission.enabled:
+            await self.app(scope, receive, send)
+            return
+        weight = request_weight(scope, admission.max_orders)
+        if weight is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await admission.acquire(weight)
+        except AdmissionRejected as e:
+            headers = {"Retry-After": str(e.retry_after)} if e.retry_after is not None else None
+            await JSONResponse({"detail": e.detail}, status_code=e.status_code, headers=headers)(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release(weight)
+
+
+admission = AdmissionController(
+    max_orders=int(os.environ.get("PRICING_MAX_INFLIGHT_ORDERS", "1000000")),
+    max_waiting=int(os.environ.get("PRICING_ADMISSION_QUEUE", "32")),
+    max_wait_ms=float(os.environ.get("PRICING_ADMISSION_WAIT_MS", "2000"))
+)
@@ -0,0 +1,85 @@
+import json
+import uuid
+from typing import Callable, Optional
+
+from fastapi import Request, Response
+
+# Distinguishes generations of different server processes, which all start counting at 0.
+# Workers sharing a replication log share its generations and use the log id instead.
+_EPOCH = uuid.uuid4().hex[:8]
+
+
+def render_json(content) -> bytes:
+    # Same encoding FastAPI's JSONResponse uses, so cached bodies match uncached ones byte for byte
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class CatalogResponseCache:
+    # Rendered catalog response bodies, valid until the store generation changes
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._bodies = {}
+        self._generation = None
+        self.epoch = _EPOCH
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def etag(self, generation: int) -> str:
+        return f'"{self.epoch}-{generation}"'
+
+    def get(self, key: str, generation: int) -> Optional[bytes]:
+        if generation != self._generation:
+            self._bodies.clear()
+            self._generation = generation
+            return None
+        return self._bodies.get(key)
+
+    def put(self, key: str, generation: int, body: bytes):
+        if generation != self._generation:
+            return
+        if len(self._bodies) >= self.max_entries:
+            self._bodies.clear()
+        self._bodies[key] = body
+
+    def respond(self, request: Request, generation: int, render: Callable[[], bytes]) -> Response:
+        # 304 when the client already holds this generation, otherwise a cached or freshly rendered body
+        etag = self.etag(generation)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers={"ETag": etag})
+
+        key = request.url.path + "?" + request.url.query
+        body = self.get(key, generation)
+        if body is None:
+            self.misses += 1
+            body = render()
+            self.put(key, generation, body)
+        else:
+            self.hits += 1
+        return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._bodies),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified
+        }
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+catalog_cache = CatalogResponseCache()
@@ -0,0 +1,83 @@
+import asyncio
+import os
+from typing import Callable, Dict, List, Any
+
+
+class PriceCoalescer:
+    # Collects single-order pricing calls arriving within a short window and prices them
+    # as one batch on the executor, resolving each caller's future with its result
+
+    def __init__(self, price_batch: Callable[[List[Dict[str, Any]]], List[dict]], executor, window_ms: float, max_batch: int):
+        self.price_batch = price_batch
+        self.executor = executor
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []  # [(order_dict, future)]
+        self._flush_handle = None
+        self._batch_tasks = set()
+        self.batches = 0
+        self.orders = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    async def submit(self, order_dict: Dict[str, Any]) -> dict:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((order_dict, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        self.batches += 1
+        self.orders += len(batch)
+        task = asyncio.get_running_loop().create_task(self._price(batch))
+        self._batch_tasks.add(task)
+        task.add_done_callback(self._batch_tasks.discard)
+
+    async def _price(self, batch: list):
+        try:
+            results = await self.executor.run(self.price_batch, [order_dict for order_dict, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "orders": self.orders,
+            "avg_batch_size": round(self.orders / self.batches, 2) if self.batches else 0.0
+        }
+
+
+def coalescer_from_env(price_batch: Callable[[List[Dict[str, Any]]], List[dict]], executor) -> PriceCoalescer:
+    # Disabled unless PRICING_COALESCE_WINDOW_MS is set to a positive value
+    return PriceCoalescer(
+        price_batch,
+        executor,
+        window_ms=float(os.environ.get("PRICING_COALESCE_WINDOW_MS", "0")),
+        max_batch=int(os.environ.get("PRICING_COALESCE_MAX_BATCH", "64"))
+    )
@@ -0,0 +1,160 @@
+import json
+import struct
+import sys
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib decoder is used without it
+    orjson = None
+
+ORDER_FIELDS = ("customer_id", "product_id", "quantity")
+# Orders decoded or encoded between calls to a checkpoint callback
+CHECKPOINT_INTERVAL = 1000
+
+
+class OrderDecodeError(ValueError):
+    pass
+
+
+def loads(body: bytes):
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def _as_int(value: Any, location: str) -> int:
+    # Accepts the same inputs as a lax Pydantic int field
+    if type(value) is int:
+        return value
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float):
+        if value.is_integer():
+            return int(value)
+        raise OrderDecodeError(f"{location}: Input should be a valid integer, got a number with a fractional part")
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise OrderDecodeError(f"{location}: Input should be a valid integer")
+
+
+def decode_bulk_orders(body: bytes, checkpoint: Optional[Callable[[], Any]] = None) -> List[Dict[str, int]]:
+    # Decode {"orders": [{"customer_id", "product_id", "quantity"}, ...]} without building models.
+    # checkpoint, when given, is called every CHECKPOINT_INTERVAL orders
+    try:
+        payload = loads(body)
+    except ValueError as e:
+        raise OrderDecodeError(f"Invalid JSON: {str(e)}")
+
+    if not isinstance(payload, dict) or not isinstance(payload.get("orders"), list):
+        raise OrderDecodeError("Body must be an object with an 'orders' array")
+
+    items = payload["orders"]
+    if checkpoint is None:
+        return [decode_order(item, f"orders[{index}]") for index, item in enumerate(items)]
+    orders = []
+    for start in range(0, len(items), CHECKPOINT_INTERVAL):
+        checkpoint()
+        orders.extend(
+            decode_order(item, f"orders[{index}]")
+            for index, item in enumerate(items[start:start + CHECKPOINT_INTERVAL], start)
+        )
+    return orders
+
+
+def decode_order(item: Any, location: str) -> Dict[str, int]:
+    # Fast path for the usual shape: a dict with three plain int fields
+    if type(item) is dict:
+        customer_id, product_id, quantity = item.get("customer_id"), item.get("product_id"), item.get("quantity")
+        if type(customer_id) is int and type(product_id) is int and type(quantity) is int:
+            return {"customer_id": customer_id, "product_id": product_id, "quantity": quantity}
+    if not isinstance(item, dict):
+        raise OrderDecodeError(f"{location}: Input should be a valid object")
+    order = {}
+    for field in ORDER_FIELDS:
+        if field not in item:
+            raise OrderDecodeError(f"{location}.{field}: Field required")
+        order[field] = _as_int(item[field], f"{location}.{field}")
+    return order
+
+
+def _price_value(price) -> int:
+    # OrderResponse.price is an int; integral floats are narrowed exactly like Pydantic does
+    if type(price) is int:
+        return price
+    if isinstance(price, float) and price.is_integer():
+        return int(price)
+    raise ValueError(f"Input should be a valid integer, got a number with a fractional part ({price})")
+
+
+def encode_result(result: dict) -> str:
+    # One OrderResponse as JSON. product_id ("P001") and price_type (enum value
+    # or "ERROR") never need JSON escaping.
+    price_type = result["price_type"]
+    price_type = getattr(price_type, "value", price_type)
+    return f'{{"product_id":"{result["product_id"]}","price":{_price_value(result["price"])},"price_type":"{price_type}"}}'
+
+
+def encode_bulk_response(
+    results: List[dict], partial: Optional[dict] = None, checkpoint: Optional[Callable[[], Any]] = None
+) -> bytes:
+    # Byte-identical to BulkOrderResponse as rendered by FastAPI, which leaves out a None partial
+    if checkpoint is None:
+        parts = [encode_result(result) for result in results]
+    else:
+        parts = []
+        for start in range(0, len(results), CHECKPOINT_INTERVAL):
+            checkpoint()
+            parts.extend(encode_result(result) for result in results[start:start + CHECKPOINT_INTERVAL])
+    partial_part = f',"partial":{json.dumps(partial, separators=(",", ":"))}' if partial is not None else ""
+    return f'{{"results":[{",".join(parts)}],"total_orders":{len(parts)}{partial_part}}}'.encode("utf-8")
+
+
+# Packed columnar layout, all values little-endian:
+#   request:  b"PRC1" | uint32 count | int32[count] customer_id | int32[count] product_id | int32[count] quantity
+#   response: b"PRR1" | uint32 count | float64[count] price | uint8[count] price_type
+COLUMNAR_MEDIA_TYPE = "application/x-pricing-columns"
+COLUMNAR_REQUEST_MAGIC = b"PRC1"
+COLUMNAR_RESPONSE_MAGIC = b"PRR1"
+PRICE_TYPE_CODES = {"NORMAL": 0, "TIER": 1, "GROUP": 2, "CUSTOMER": 3, "ERROR": 255}
+_HEADER = struct.Struct("<4sI")
+
+
+def _int32_column(body: bytes, offset: int, count: int) -> array:
+    column = array("i")
+    column.frombytes(body[offset:offset + 4 * count])
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def decode_columnar_orders(body: bytes) -> Tuple[array, array, array]:
+    # Returns (customer_ids, product_ids, quantities) as int32 arrays
+    if len(body) < _HEADER.size:
+        raise OrderDecodeError("Columnar payload is shorter than its header")
+    magic, count = _HEADER.unpack_from(body)
+    if magic != COLUMNAR_REQUEST_MAGIC:
+        raise OrderDecodeError(f"Unknown columnar payload magic {magic!r}")
+    expected = _HEADER.size + 3 * 4 * count
+    if len(body) != expected:
+        raise OrderDecodeError(f"Columnar payload for {count} orders must be {expected} bytes, got {len(body)}")
+
+    offset = _HEADER.size
+    customer_ids = _int32_column(body, offset, count)
+    product_ids = _int32_column(body, offset + 4 * count, count)
+    quantities = _int32_column(body, offset + 8 * count, count)
+    return customer_ids, product_ids, quantities
+
+
+def encode_columnar_results(results: List[dict]) -> bytes:
+    prices = array("d", [result["price"] for result in results])
+    if sys.byteorder == "big":
+        prices.byteswap()
+    price_types = bytes(
+        PRICE_TYPE_CODES[getattr(result["price_type"], "value", result["price_type"])] for result in results
+    )
+    return _HEADER.pack(COLUMNAR_RESPONSE_MAGIC, len(results)) + prices.tobytes() + price_types
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+
+DEADLINE_EXCEEDED = "deadline_exceeded"
+CLIENT_DISCONNECTED = "client_disconnected"
+DEADLINE_HEADER = b"deadline-ms"
+PARTIAL_HEADER = "Pricing-Partial"
+STREAM_PATH = "/calculate-bulk-prices/stream"
+SUMMARY_PATH = "/calculate-bulk-prices/summary"
+
+
+class Deadline:
+    # Time budget of one bulk pricing request, measured from when the request arrived.
+    # Pricing loops poll should_stop() between chunks, from executor threads; a client
+    # disconnect ends the budget early.
+
+    def __init__(self, timeout_ms: float):
+        self.timeout_ms = timeout_ms
+        self.expires_at = time.monotonic() + timeout_ms / 1000 if timeout_ms > 0 else None
+        self.reason = None
+
+    def cancel(self, reason: str):
+        if self.reason is None:
+            self.reason = reason
+
+    def should_stop(self) -> bool:
+        if self.reason is None and self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self.reason = DEADLINE_EXCEEDED
+        return self.reason is not None
+
+
+class DeadlinePolicy:
+    # Hands out a Deadline per bulk pricing request and counts the responses cut short.
+    # Without a Deadline-Ms header the default applies; a default of 0 means no limit.
+
+    def __init__(self, default_ms: float):
+        self.default_ms = default_ms
+        self._lock = threading.Lock()
+        self.partial = {DEADLINE_EXCEEDED: 0, CLIENT_DISCONNECTED: 0}
+
+    def start(self, header_value: Optional[bytes], use_default: bool = True) -> Deadline:
+        # Raises ValueError for a Deadline-Ms header that is not a positive number
+        timeout_ms = self.default_ms if use_default else 0
+        if header_value is not None:
+            try:
+                timeout_ms = float(header_value)
+            except ValueError:
+                timeout_ms = 0
+            if not timeout_ms > 0:
+                raise ValueError("Deadline-Ms must be a positive number of milliseconds")
+        return Deadline(timeout_ms)
+
+    def record_partial(self, deadline: Deadline):
+        with self._lock:
+            self.partial[deadline.reason] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "default_ms": self.default_ms,
+                "partial_responses": dict(self.partial)
+            }
+
+
+def request_deadline(request) -> Deadline:
+    # The Deadline DeadlineMiddleware attached to this request
+    return request.scope["deadline"]
+
+
+@asynccontextmanager
+async def cancel_on_disconnect(request, deadline: Deadline):
+    # Only once the body has been read: the next receive() then returns when the client goes away
+    async def watch():
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            deadline.cancel(CLIENT_DISCONNECTED)
+
+    watcher = asyncio.create_task(watch())
+    try:
+        yield
+    finally:
+        watcher.cancel()
+
+
+class DeadlineMiddleware:
+    # Pure ASGI middleware starting the deadline of bulk pricing requests as they arrive, so
+    # time spent waiting for admission and reading the body counts against it
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"].startswith("/calculate-bulk-prices"):
+            header_value = next((value for name, value in scope["headers"] if name == DEADLINE_HEADER), None)
+            try:
+                # Streamed bodies are meant for inputs of any length, so only an explicit header limits them
+                scope["deadline"] = deadlines.start(header_value, use_default=scope["path"] not in (STREAM_PATH, SUMMARY_PATH))
+            except ValueError as e:
+                await JSONResponse({"detail": str(e)}, status_code=400)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+deadlines = DeadlinePolicy(
+    default_ms=float(os.environ.get("PRICING_DEFAULT_DEADLINE_MS", "30000"))
+)
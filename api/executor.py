@@ -0,0 +1,173 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api.metrics import lane_queue_time
+from api.tracing import record_span
+
+INTERACTIVE_LANE = "interactive"
+BATCH_LANE = "batch"
+INTERACTIVE_ROUTES = {("POST", "/calculate-price"), ("POST", "/quotes")}
+
+
+class ExecutorFullError(Exception):
+    pass
+
+
+class LaneScheduler:
+    # Gives interactive pricing priority over batch pricing. Both lanes run on their own
+    # executors, but share the GIL, so batch pricing calls yield_to_interactive() between
+    # chunks and blocks there while any interactive request is in progress, from arrival to
+    # response. Each yield is capped at max_yield_ms so a steady interactive load slows
+    # batches without starving them.
+
+    def __init__(self, max_yield_ms: float):
+        self.max_yield = max_yield_ms / 1000
+        self._condition = threading.Condition()
+        self.interactive_active = 0
+        self.yields = 0
+        self.yield_seconds = 0.0
+
+    def interactive_started(self):
+        with self._condition:
+            self.interactive_active += 1
+
+    def interactive_finished(self):
+        with self._condition:
+            self.interactive_active -= 1
+            if self.interactive_active == 0:
+                self._condition.notify_all()
+
+    def yield_to_interactive(self):
+        # Unlocked read first: the common case, no interactive work, costs one attribute load
+        if not self.interactive_active:
+            return
+        started_at = time.perf_counter()
+        with self._condition:
+            if not self.interactive_active:
+                return
+            self._condition.wait_for(lambda: not self.interactive_active, self.max_yield)
+            self.yields += 1
+            self.yield_seconds += time.perf_counter() - started_at
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "interactive_active": self.interactive_active,
+                "max_yield_ms": self.max_yield * 1000,
+                "batch_yields": self.yields,
+                "batch_yield_ms": round(self.yield_seconds * 1000, 3)
+            }
+
+
+class BoundedExecutor:
+    # Thread pool with a bounded wait queue that keeps CPU-bound pricing off the event loop
+
+    def __init__(self, name: str, lane: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.lane = lane
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def run(self, func, *args):
+        # Run func(*args) on the pool, raising ExecutorFullError when the queue is full
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise ExecutorFullError(f"{self.name} queue is full ({self.max_queue} waiting)")
+            self.queued += 1
+
+        submitted_at = time.perf_counter()
+
+        def task():
+            started_at = time.perf_counter()
+            waited = started_at - submitted_at
+            record_span("executor_wait", submitted_at, started_at)
+            lane_queue_time.observe(waited, self.lane)
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+
+        # Run in a copy of the caller's context so request tracing follows the work onto the pool
+        future = self._executor.submit(contextvars.copy_context().run, task)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A task cancelled before it started never reaches task(), so release its queue slot here
+            if future.cancel():
+                with self._lock:
+                    self.queued -= 1
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.completed + self.running
+            return {
+                "name": self.name,
+                "lane": self.lane,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait / started * 1000, 3) if started else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3)
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LaneMiddleware:
+    # Pure ASGI middleware marking interactive requests in progress for the lane scheduler.
+    # The whole request counts, since the event loop needs the GIL to parse and answer it too.
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in INTERACTIVE_ROUTES:
+            await self.app(scope, receive, send)
+            return
+        lanes.interactive_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lanes.interactive_finished()
+
+
+lanes = LaneScheduler(max_yield_ms=float(os.environ.get("PRICING_BATCH_MAX_YIELD_MS", "20")))
+
+interactive_executor = BoundedExecutor(
+    "interactive-pricing",
+    INTERACTIVE_LANE,
+    max_workers=int(os.environ.get("PRICING_INTERACTIVE_WORKERS", "2")),
+    max_queue=int(os.environ.get("PRICING_INTERACTIVE_QUEUE", "256"))
+)
+
+bulk_executor = BoundedExecutor(
+    "bulk-pricing",
+    BATCH_LANE,
+    max_workers=int(os.environ.get("PRICING_BULK_WORKERS", "2")),
+    max_queue=int(os.environ.get("PRICING_BULK_QUEUE", "16"))
+)
@@ -0,0 +1,106 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+
+class IdempotencyConflictError(Exception):
+    pass
+
+
+def fingerprint(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class IdempotencyCache:
+    # Responses of completed calls keyed by Idempotency-Key, bounded by TTL and entry count.
+    # Concurrent calls with a key that is still being computed wait for that computation.
+    # Failed calls are not cached, so a retry after an error runs again; neither are responses
+    # the cacheable predicate rejects, such as partial results of a call that ran out of time.
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (fingerprint, expires_at, response)
+        self._in_flight = {}           # key -> (fingerprint, future)
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+
+    async def run(
+        self, key: Hashable, request_fingerprint: str, compute: Callable[[], Awaitable[Any]],
+        cacheable: Optional[Callable[[Any], bool]] = None
+    ) -> Tuple[Any, bool]:
+        # Returns (response, replayed)
+        now = time.monotonic()
+        self._evict(now)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._check(entry[0], request_fingerprint)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2], True
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self._check(in_flight[0], request_fingerprint)
+            self.waits += 1
+            response, cached = await asyncio.shield(in_flight[1])
+            if cached:
+                return response, True
+            # The call waited on was not cached, so this one is computed in its own right
+            return await self.run(key, request_fingerprint, compute, cacheable)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        # Mark any exception as retrieved when nobody else is waiting on it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._in_flight[key] = (request_fingerprint, future)
+        try:
+            response = await compute()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._in_flight[key]
+
+        cached = cacheable is None or cacheable(response)
+        if cached:
+            self._entries[key] = (request_fingerprint, time.monotonic() + self.ttl, response)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        future.set_result((response, cached))
+        return response, False
+
+    def _evict(self, now: float):
+        # Entries are kept in insertion/use order, so expired ones are not necessarily first;
+        # a full scan only happens when the oldest entry has expired
+        if self._entries and next(iter(self._entries.values()))[1] <= now:
+            for key in [key for key, entry in self._entries.items() if entry[1] <= now]:
+                del self._entries[key]
+
+    @staticmethod
+    def _check(stored_fingerprint: str, request_fingerprint: str):
+        if stored_fingerprint != request_fingerprint:
+            raise IdempotencyConflictError("Idempotency-Key was already used with a different request body")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits
+        }
+
+
+idempotency_cache = IdempotencyCache(
+    ttl_seconds=float(os.environ.get("PRICING_IDEMPOTENCY_TTL_SECONDS", "600")),
+    max_entries=int(os.environ.get("PRICING_IDEMPOTENCY_MAX_ENTRIES", "1024"))
+)
@@ -0,0 +1,243 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from data.memory import Memory
+from price_calculator import find_best_applicable_price_batch
+from api.codec import loads, decode_order, encode_result, OrderDecodeError
+from api.metrics import record_pricing
+from api.executor import lanes
+
+JOB_PAGE_SIZE = 1000
+
+
+class PricingJob:
+
+    def __init__(self, job_id: str, input_path: Optional[str] = None, orders: Optional[List[dict]] = None):
+        self.job_id = job_id
+        self.input_path = input_path
+        self.orders = orders
+        self.status = "queued"
+        self.total = len(orders) if orders is not None else None
+        self.processed = 0
+        self.errors = 0
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.results_path = None
+        self.page_ends = []  # Byte offset where each completed page ends in the results file
+
+    def to_dict(self) -> dict:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total_orders": self.total,
+            "processed_orders": self.processed,
+            "error_orders": self.errors,
+            "progress": round(self.processed / self.total, 4) if self.total else None,
+            "orders_per_second": round(self.processed / elapsed, 1) if elapsed else None,
+            "elapsed_seconds": round(elapsed, 3) if elapsed is not None else None,
+            "pages_available": len(self.page_ends),
+            "page_size": JOB_PAGE_SIZE,
+            "error": self.error
+        }
+
+
+class JobManager:
+    # Runs bulk pricing jobs on a worker pool independent of the request that submitted them.
+    # Results are written as NDJSON, one page per JOB_PAGE_SIZE orders. Jobs price against the
+    # catalog as it was when they started and do not add to the order/result history.
+    # Finished jobs are kept for ttl_seconds, and at most max_finished of them; pruned jobs are
+    # forgotten and their upload and results files deleted. Jobs still running are never pruned.
+
+    def __init__(self, job_dir: str, input_dir: str, max_concurrency: int, ttl_seconds: float, max_finished: int):
+        self.job_dir = job_dir
+        self.input_dir = os.path.realpath(input_dir)
+        self.max_concurrency = max_concurrency
+        self.ttl = ttl_seconds
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="pricing-job")
+        self._jobs: Dict[str, PricingJob] = {}
+        self._lock = threading.Lock()
+        self.pruned = 0
+
+    def new_upload_path(self) -> tuple:
+        # Reserve a job id and a file to stream an uploaded NDJSON body into
+        os.makedirs(self.job_dir, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        return job_id, self._upload_path(job_id)
+
+    def _upload_path(self, job_id: str) -> str:
+        return os.path.join(self.job_dir, f"{job_id}.orders.ndjson")
+
+    def discard_upload(self, job_id: str):
+        # Remove the spooled body of an upload that never became a job
+        _remove(self._upload_path(job_id))
+
+    def resolve_input(self, source_path: str) -> str:
+        # Server-side order files must live under the configured input directory
+        path = os.path.realpath(os.path.join(self.input_dir, source_path))
+        if os.path.commonpath([path, self.input_dir]) != self.input_dir:
+            raise ValueError(f"source_path must be inside {self.input_dir}")
+        if not os.path.isfile(path):
+            raise ValueError(f"Order file not found: {source_path}")
+        return path
+
+    def submit(self, job_id: Optional[str] = None, input_path: Optional[str] = None,
+               orders: Optional[List[dict]] = None) -> PricingJob:
+        job = PricingJob(job_id or uuid.uuid4().hex, input_path=input_path, orders=orders)
+        self.prune()
+        with self._lock:
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[PricingJob]:
+        self.prune()
+        return self._jobs.get(job_id)
+
+    def prune(self):
+        # Forget finished jobs past their TTL or beyond max_finished, oldest first
+        now = time.time()
+        with self._lock:
+            finished = sorted(
+                (job for job in self._jobs.values() if job.finished_at is not None), key=lambda job: job.finished_at
+            )
+            excess = len(finished) - self.max_finished
+            expired = [
+                job for index, job in enumerate(finished) if index < excess or now - job.finished_at >= self.ttl
+            ]
+            for job in expired:
+                del self._jobs[job.job_id]
+        for job in expired:
+            _remove(self._upload_path(job.job_id))
+            if job.results_path is not None:
+                _remove(job.results_path)
+        self.pruned += len(expired)
+
+    def read_page(self, job: PricingJob, page: int) -> List[dict]:
+        start = job.page_ends[page - 1] if page > 0 else 0
+        end = job.page_ends[page]
+        with open(job.results_path, "rb") as results_file:
+            results_file.seek(start)
+            data = results_file.read(end - start)
+        return [json.loads(line) for line in data.splitlines() if line]
+
+    def _iter_orders(self, job: PricingJob) -> Iterator[tuple]:
+        # Yields (line number, order dict or OrderDecodeError)
+        if job.orders is not None:
+            for line_number, order in enumerate(job.orders, 1):
+                yield line_number, order
+            return
+
+        with open(job.input_path, "rb") as input_file:
+            # Blank lines are skipped but counted, like the streaming endpoints
+            for line_number, line in enumerate(input_file, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield line_number, decode_order(loads(line), f"line {line_number}")
+                except (OrderDecodeError, ValueError) as e:
+                    yield line_number, OrderDecodeError(str(e))
+
+    def _run(self, job: PricingJob):
+        job.status = "running"
+        job.started_at = time.time()
+        os.makedirs(self.job_dir, exist_ok=True)
+        job.results_path = os.path.join(self.job_dir, f"{job.job_id}.results.ndjson")
+        try:
+            if job.total is None:
+                job.total = _count_lines(job.input_path)
+
+            customers_dict = Memory.get_all_customers()
+            products_dict = Memory.get_all_products()
+
+            with open(job.results_path, "wb") as results_file:
+                page = []
+                for entry in self._iter_orders(job):
+                    page.append(entry)
+                    if len(page) >= JOB_PAGE_SIZE:
+                        self._write_page(job, results_file, page, products_dict, customers_dict)
+                        page = []
+                if page:
+                    self._write_page(job, results_file, page, products_dict, customers_dict)
+
+            job.total = job.processed
+            job.status = "completed"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            job.orders = None
+
+    def _write_page(self, job: PricingJob, results_file, page: list, products_dict: list, customers_dict: list):
+        orders = [order for _, order in page if not isinstance(order, OrderDecodeError)]
+        # Jobs are batch work, so they give way to interactive pricing between chunks
+        results = find_best_applicable_price_batch(orders, products_dict, customers_dict, _yield_to_interactive)
+        record_pricing("job", results)
+        results = iter(results)
+
+        lines = []
+        for line_number, order in page:
+            if isinstance(order, OrderDecodeError):
+                job.errors += 1
+                lines.append(json.dumps({"line": line_number, "error": str(order)}))
+                continue
+            result = next(results)
+            try:
+                lines.append(encode_result(result))
+            except ValueError as e:
+                job.errors += 1
+                lines.append(json.dumps({"line": line_number, "error": str(e)}))
+
+        results_file.write(("\n".join(lines) + "\n").encode("utf-8"))
+        results_file.flush()
+        job.processed += len(page)
+        # Published last, so readers only ever see fully written pages
+        job.page_ends.append(results_file.tell())
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _yield_to_interactive() -> bool:
+    lanes.yield_to_interactive()
+    return False
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _count_lines(path: str) -> int:
+    count = 0
+    with open(path, "rb") as input_file:
+        for line in input_file:
+            if line.strip():
+                count += 1
+    return count
+
+
+_default_job_dir = os.path.join(tempfile.gettempdir(), "pricing-jobs")
+
+job_manager = JobManager(
+    job_dir=os.environ.get("PRICING_JOB_DIR", _default_job_dir),
+    input_dir=os.environ.get("PRICING_JOB_INPUT_DIR", os.environ.get("PRICING_JOB_DIR", _default_job_dir)),
+    max_concurrency=int(os.environ.get("PRICING_JOB_CONCURRENCY", "2")),
+    ttl_seconds=float(os.environ.get("PRICING_JOB_TTL_SECONDS", "3600")),
+    max_finished=int(os.environ.get("PRICING_JOB_MAX_FINISHED", "100"))
+)
@@ -1,20 +1,46 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Dict, Any
+from fastapi import FastAPI, HTTPException, Request, Response, Query, Header
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Dict, Any, Optional
 import sys
 import os
+import asyncio
+import json
+import time
 
 # Add parent directory to path to import our modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from data.memory import Memory
+from data.change_feed import change_feed
+from data.audit_log import audit_log
 from models.customer import Customer
 from models.product import Product
 from constants.group import Group
 from constants.tier import Tier
-from price_calculator import find_best_applicable_price
+from price_calculator import (
+    find_best_applicable_price, find_best_applicable_price_batch, find_best_applicable_price_columns, find_price_breakpoints,
+    PriceSummary, STOP_CHECK_INTERVAL
+)
+from api.streaming import iter_ndjson_lines, iter_chunks, NDJSONStreamingResponse, sse_event
+from api.executor import bulk_executor, interactive_executor, lanes, ExecutorFullError, LaneMiddleware
+from api.coalescer import coalescer_from_env
+from api.jobs import job_manager
+from api.idempotency import idempotency_cache, fingerprint, IdempotencyConflictError
+from api.admission import admission, AdmissionMiddleware, AdmissionRejected
+from api.deadline import deadlines, request_deadline, cancel_on_disconnect, DeadlineMiddleware, PARTIAL_HEADER
+from api.replication import replication_log, replicated_write, ReplicationMiddleware
+from api.socket_server import socket_server
+from api.quotes import quote_store, QuoteError
+from api.tracing import span, traced_endpoint, tracer, TracingMiddleware
+from api.metrics import registry, record_pricing, record_price_type_counts, CallbackMetric, MetricsMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from api.catalog_cache import catalog_cache, render_json
+from api.codec import (
+    decode_bulk_orders, decode_order, encode_bulk_response, decode_columnar_orders, encode_columnar_results,
+    loads, OrderDecodeError, COLUMNAR_MEDIA_TYPE
+)
 
-# FastAPI app is now created above with lifespan
+BATCH_GET_MAX_IDS = 10000
 
 # Pydantic models for request/response
 class OrderRequest(BaseModel):
@@ -30,9 +56,65 @@ class OrderResponse(BaseModel):
 class BulkOrderRequest(BaseModel):
     orders: List[OrderRequest]
 
+class PartialResults(BaseModel):
+    reason: str  # deadline_exceeded or client_disconnected
+    priced_orders: int
+    requested_orders: int
+
 class BulkOrderResponse(BaseModel):
     results: List[OrderResponse]
     total_orders: int
+    partial: Optional[PartialResults] = None  # Only present when pricing stopped early
+
+class PriceTypeSummary(BaseModel):
+    orders: int
+    quantity: int
+    revenue: float
+    discount: float  # (base price - price) * quantity
+
+class BulkSummaryResponse(BaseModel):
+    orders: int
+    invalid_lines: int
+    quantity: int
+    revenue: float
+    discount: float
+    by_price_type: Dict[str, PriceTypeSummary]  # CUSTOMER, TIER, GROUP, NORMAL and ERROR
+    partial: Optional[PartialResults] = None  # Only present when pricing stopped early
+
+class QuoteResponse(BaseModel):
+    token: str
+    quote_id: str
+    order: OrderRequest
+    product_id: str
+    price: int
+    price_type: str
+    issued_at: float
+    expires_at: float
+
+class QuoteRedeemRequest(BaseModel):
+    token: str
+
+class QuoteRedemption(BaseModel):
+    quote_id: str
+    order: OrderRequest
+    product_id: str
+    price: int
+    price_type: str
+    issued_at: float
+    expires_at: float
+    redeemed_at: float
+
+class LadderStep(BaseModel):
+    min_quantity: int
+    max_quantity: Optional[int]  # None: no upper bound
+    price: int
+    price_type: str
+
+class PriceLadder(BaseModel):
+    customer_id: int
+    product_id: str
+    base_price: float
+    steps: List[LadderStep]
 
 class CustomerInfo(BaseModel):
     customer_id: int
@@ -67,6 +149,10 @@ class ProductCreate(BaseModel):
     name: str
     base_price: float
 
+class ProductUpdate(BaseModel):
+    name: Optional[str] = None
+    base_price: Optional[float] = None
+
 class TierPriceRule(BaseModel):
     product_id: int
     tier: str
@@ -85,6 +171,27 @@ class LoyaltyPriceRule(BaseModel):
     discount_rate: float
     min_qty: int
 
+class RuleChange(BaseModel):
+    op: str    # "upsert" or "delete"
+    kind: str  # "tier", "group" or "loyalty"
+    product_id: int
+    customer_id: Optional[int] = None
+    tier: Optional[str] = None
+    group: Optional[str] = None
+    discount_rate: Optional[float] = None
+    min_qty: Optional[int] = None
+
+class RuleChangeset(BaseModel):
+    changes: List[RuleChange]
+    atomic: bool = True
+
+class BatchGetRequest(BaseModel):
+    ids: List[int] = Field(min_length=1, max_length=BATCH_GET_MAX_IDS)
+
+class JobCreate(BaseModel):
+    orders: Optional[List[OrderRequest]] = None
+    source_path: Optional[str] = None
+
 class OrderHistory(BaseModel):
     order_id: int
     customer_id: int
@@ -100,8 +207,41 @@ async def lifespan(app: FastAPI):
     # Startup
     Memory.clear_all()
     print("Pricing Engine API started - Memory cleared")
+    follow_task = None
+    if replication_log.path:
+        # Replay the shared log so this worker starts with the same catalog as the others
+        replication_log.open()
+        catalog_cache.epoch = replication_log.log_id
+        follow_task = asyncio.create_task(replication_log.follow())
+        print(f"Replicating catalog through {replication_log.path} (generation {Memory.generation})")
+    if audit_log.path:
+        audit_log.start()
+        print(f"Auditing orders and results to {audit_log.path} ({audit_log.durability} durability)")
+    if socket_server.path:
+        await socket_server.start()
+        print(f"Serving pricing on Unix socket {socket_server.bound_path}")
+    if replication_log.path and quote_store.shareable:
+        # Any worker may get the redeem call for a quote another worker issued
+        quote_store.open(shared=True)
+        print(f"Sharing quotes between workers through {quote_store.spill_path}")
+    elif replication_log.path:
+        # A token could reach a worker that never saw the quote, so only the catalog is replicated
+        quote_store.disable("PRICING_QUOTE_SECRET and PRICING_QUOTE_SPILL_PATH must be set when the catalog is replicated")
+    elif quote_store.spill_path:
+        quote_store.open()
+        print(f"Spilling quotes beyond {quote_store.max_entries} to {quote_store.spill_path}")
     yield
-    # Shutdown (if needed)
+    # Shutdown
+    await socket_server.close()
+    if follow_task is not None:
+        follow_task.cancel()
+        replication_log.close()
+    interactive_executor.shutdown()
+    bulk_executor.shutdown()
+    job_manager.shutdown()
+    tracer.close()
+    audit_log.close()
+    quote_store.close()
     print("Pricing Engine API shutting down")
 
 app = FastAPI(
@@ -111,6 +251,13 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+app.add_middleware(ReplicationMiddleware)
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(LaneMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
 @app.get("/")
 async def root():
     # Root endpoint with API information
@@ -123,31 +270,59 @@ async def root():
             "system": {
                 "health": "GET /health",
                 "status": "GET /status", 
+                "executor_status": "GET /status/executors",
+                "metrics": "GET /metrics",
                 "load_sample_data": "POST /load-sample-data",
                 "clear_data": "DELETE /clear-data"
             },
             "customers": {
-                "list_customers": "GET /customers",
-                "get_customer": "GET /customers/{customer_id}",
+                "list_customers": "GET /customers?fields=&tier=&group=&limit=&after=",
+                "get_customer": "GET /customers/{customer_id}?fields=",
+                "batch_get_customers": "POST /customers:batchGet?fields=",
                 "create_customer": "POST /customers",
                 "delete_customer": "DELETE /customers/{customer_id}",
-                "add_loyalty_pricing": "POST /customers/{customer_id}/loyalty-prices"
+                "add_loyalty_pricing": "POST /customers/{customer_id}/loyalty-prices",
+                "price_ladder": "GET /customers/{customer_id}/products/{product_id}/ladder"
             },
             "products": {
-                "list_products": "GET /products",
-                "get_product": "GET /products/{product_id}",
+                "list_products": "GET /products?fields=",
+                "get_product": "GET /products/{product_id}?fields=",
+                "batch_get_products": "POST /products:batchGet?fields=",
                 "create_product": "POST /products",
+                "update_product": "PATCH /products/{product_id}",
                 "delete_product": "DELETE /products/{product_id}",
                 "add_tier_pricing": "POST /products/{product_id}/tier-prices",
                 "add_group_pricing": "POST /products/{product_id}/group-prices"
             },
+            "pricing_rules": {
+                "apply_rule_changeset": "POST /pricing-rules/batch"
+            },
+            "changes": {
+                "get_changes": "GET /changes?after=&limit=",
+                "stream_changes": "GET /changes/stream?after="
+            },
             "pricing": {
                 "calculate_single_price": "POST /calculate-price",
-                "calculate_bulk_prices": "POST /calculate-bulk-prices"
+                "calculate_bulk_prices": "POST /calculate-bulk-prices",
+                "fast_bulk_prices": "POST /calculate-bulk-prices/fast",
+                "columnar_bulk_prices": "POST /calculate-bulk-prices/columnar",
+                "stream_bulk_prices": "POST /calculate-bulk-prices/stream",
+                "summarize_bulk_prices": "POST /calculate-bulk-prices/summary"
+            },
+            "quotes": {
+                "create_quote": "POST /quotes",
+                "redeem_quote": "POST /quotes/redeem"
+            },
+            "jobs": {
+                "create_job": "POST /jobs",
+                "upload_job": "POST /jobs/upload",
+                "get_job": "GET /jobs/{job_id}",
+                "get_job_results": "GET /jobs/{job_id}/results?page=",
+                "download_job_results": "GET /jobs/{job_id}/results/file"
             },
             "orders": {
-                "get_orders": "GET /orders",
-                "get_results": "GET /results"
+                "get_orders": "GET /orders?limit=&after=&customer_id=&product_id=&price_type=",
+                "get_results": "GET /results?limit=&after=&customer_id=&product_id=&price_type="
             }
         },
         "features": [
@@ -155,6 +330,7 @@ async def root():
             "Dynamic pricing rules management",
             "Tier, Group, and Loyalty pricing support",
             "Bulk price calculations",
+            "NDJSON streaming for large bulk price calculations",
             "Order tracking and result history",
             "Comprehensive error handling",
             "OpenAPI/Swagger documentation"
@@ -171,6 +347,7 @@ async def health_check():
     }
 
 @app.post("/load-sample-data")
+@replicated_write
 async def load_sample_data():
     # Load sample data for testing
     try:
@@ -231,9 +408,68 @@ async def load_sample_data():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error loading sample data: {str(e)}")
 
+async def run_idempotent(route: str, idempotency_key: Optional[str], request_body, headers, compute, cacheable=None):
+    # Without a key every call is computed; with one, retries replay the first response.
+    # request_body returns the bytes to fingerprint, so they are only built when a key is sent.
+    if idempotency_key is None:
+        return await compute()
+    try:
+        result, replayed = await idempotency_cache.run(
+            (route, idempotency_key), fingerprint(request_body()), compute, cacheable
+        )
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if replayed:
+        headers["Idempotent-Replayed"] = "true"
+    return result
+
+def price_order_batch(orders_dict: List[Dict[str, Any]]) -> List[dict]:
+    # Price a coalesced batch of single orders with one catalog materialization
+    customers_dict = Memory.get_all_customers()
+    products_dict = Memory.get_all_products()
+    
+    results = find_best_applicable_price_batch(orders_dict, products_dict, customers_dict)
+    record_pricing("coalesced", results)
+    
+    Memory.add_order_results(orders_dict, results)
+    
+    return results
+
+price_coalescer = coalescer_from_env(price_order_batch, interactive_executor)
+
 @app.post("/calculate-price", response_model=OrderResponse)
-async def calculate_price(order: OrderRequest):
+@traced_endpoint
+async def calculate_price(order: OrderRequest, response: Response, idempotency_key: Optional[str] = Header(None)):
     # Calculate the best applicable price for a single order
+    return await run_idempotent(
+        "calculate-price", idempotency_key, lambda: order.model_dump_json().encode(), response.headers,
+        lambda: price_single_order(order)
+    )
+
+def price_single(order_dict: Dict[str, Any]) -> Optional[dict]:
+    # Get data in dictionary format for price calculator
+    with span("materialize"):
+        customers_dict = Memory.get_all_customers()
+        products_dict = Memory.get_all_products()
+    
+    # Calculate best price
+    with span("evaluate"):
+        results = find_best_applicable_price([order_dict], products_dict, customers_dict)
+    record_pricing("single", results)
+    
+    if not results:
+        return None
+    
+    result = results[0]
+    
+    # Store the order and result in memory
+    with span("store"):
+        Memory.add_order_result(order_dict['customer_id'], order_dict['product_id'], order_dict['quantity'], result)
+    
+    return result
+
+async def price_single_order(order: OrderRequest) -> OrderResponse:
+
     try:
         # Validate that customers and products exist
         if not Memory.customers:
@@ -249,21 +485,16 @@ async def calculate_price(order: OrderRequest):
             "quantity": order.quantity
         }
         
-        # Get data in dictionary format for price calculator
-        customers_dict = Memory.get_all_customers()
-        products_dict = Memory.get_all_products()
-        
-        # Calculate best price
-        results = find_best_applicable_price([order_dict], products_dict, customers_dict)
-        
-        if not results:
-            raise HTTPException(status_code=500, detail="No price calculated")
-        
-        result = results[0]
-        
-        # Store the order and result in memory
-        Memory.add_order(order.customer_id, order.product_id, order.quantity)
-        Memory.add_result(result['product_id'], result['price'], result['price_type'])
+        if price_coalescer.enabled:
+            # Priced and stored together with other requests from the same window
+            with span("coalesced_batch"):
+                result = await price_coalescer.submit(order_dict)
+        else:
+            # The interactive lane: batch pricing yields to it between chunks
+            result = await interactive_executor.run(price_single, order_dict)
+            
+            if result is None:
+                raise HTTPException(status_code=500, detail="No price calculated")
         
         return OrderResponse(
             product_id=result['product_id'],
@@ -271,14 +502,135 @@ async def calculate_price(order: OrderRequest):
             price_type=result['price_type']
         )
         
+    except ExecutorFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating price: {str(e)}")
 
-@app.post("/calculate-bulk-prices", response_model=BulkOrderResponse)
-async def calculate_bulk_prices(bulk_request: BulkOrderRequest):
+def price_quote(order_dict: Dict[str, Any]) -> Optional[dict]:
+    # Like price_single, but nothing is stored until the quote is redeemed
+    customers_dict = Memory.get_all_customers()
+    products_dict = Memory.get_all_products()
+    results = find_best_applicable_price([order_dict], products_dict, customers_dict)
+    record_pricing("quote", results)
+    return results[0] if results else None
+
+@app.post("/quotes", response_model=QuoteResponse)
+@traced_endpoint
+async def create_quote(order: OrderRequest):
+    # Price an order and lock the price in a signed quote token for checkout to redeem
+    try:
+        quote_store.check_available()
+        
+        if not Memory.customers:
+            raise HTTPException(status_code=400, detail="No customers found. Please load sample data first.")
+        
+        if not Memory.products:
+            raise HTTPException(status_code=400, detail="No products found. Please load sample data first.")
+        
+        order_dict = order.model_dump()
+        result = await interactive_executor.run(price_quote, order_dict)
+        if result is None:
+            raise HTTPException(status_code=500, detail="No price calculated")
+        
+        return quote_store.issue(order_dict, result)
+        
+    except QuoteError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except ExecutorFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating quote: {str(e)}")
+
+@app.post("/quotes/redeem", response_model=QuoteRedemption)
+@traced_endpoint
+async def redeem_quote(redeem_request: QuoteRedeemRequest):
+    # Confirm the locked price of a quote, once, and record it as an order; no re-pricing
+    try:
+        quote = quote_store.redeem(redeem_request.token)
+        
+        order_dict = quote["order"]
+        Memory.add_order_result(order_dict['customer_id'], order_dict['product_id'], order_dict['quantity'], quote)
+        
+        return quote
+        
+    except QuoteError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error redeeming quote: {str(e)}")
+
+def partial_results(deadline, priced_orders: int, requested_orders: int) -> Optional[Dict[str, Any]]:
+    # Marker for a bulk response whose pricing stopped at its deadline or on client disconnect
+    if priced_orders == requested_orders:
+        return None
+    deadlines.record_partial(deadline)
+    return {"reason": deadline.reason, "priced_orders": priced_orders, "requested_orders": requested_orders}
+
+def batch_checkpoint(deadline):
+    # Called between chunks of batch pricing: give way to interactive pricing, then check the deadline
+    def checkpoint() -> bool:
+        lanes.yield_to_interactive()
+        return deadline.should_stop()
+    return checkpoint
+
+def store_priced_orders(orders_dict: List[Dict[str, Any]], results: List[dict]):
+    # Record a priced batch in the order history, giving way to interactive pricing between chunks
+    for start in range(0, len(results), STOP_CHECK_INTERVAL):
+        lanes.yield_to_interactive()
+        end = start + STOP_CHECK_INTERVAL
+        Memory.add_order_results(orders_dict[start:end], results[start:end])
+
+def price_bulk_orders(orders_dict: List[Dict[str, Any]], deadline) -> BulkOrderResponse:
+    # CPU-bound part of bulk pricing, run on the bulk executor
+    with span("materialize"):
+        customers_dict = Memory.get_all_customers()
+        products_dict = Memory.get_all_products()
+    
+    # Calculate best prices chunk by chunk, stopping once the deadline has passed
+    with span("evaluate"):
+        results = find_best_applicable_price(orders_dict, products_dict, customers_dict, batch_checkpoint(deadline))
+    record_pricing("bulk", results)
+    
+    # Store orders and results in memory
+    with span("store"):
+        store_priced_orders(orders_dict, results)
+    
+    # Convert results to response format
+    with span("build_response"):
+        response_results = []
+        for result in results:
+            response_results.append(OrderResponse(
+                product_id=result['product_id'],
+                price=result['price'],
+                price_type=result['price_type']
+            ))
+    
+    return BulkOrderResponse(
+        results=response_results,
+        total_orders=len(results),
+        partial=partial_results(deadline, len(results), len(orders_dict))
+    )
+
+@app.post("/calculate-bulk-prices", response_model=BulkOrderResponse, response_model_exclude_none=True)
+@traced_endpoint
+async def calculate_bulk_prices(
+    bulk_request: BulkOrderRequest, request: Request, response: Response, idempotency_key: Optional[str] = Header(None)
+):
     # Calculate the best applicable prices for multiple orders
+    result = await run_idempotent(
+        "calculate-bulk-prices", idempotency_key, lambda: bulk_request.model_dump_json().encode(), response.headers,
+        lambda: price_bulk_request(bulk_request, request), cacheable=lambda result: result.partial is None
+    )
+    if result.partial is not None:
+        response.headers[PARTIAL_HEADER] = result.partial.reason
+    return result
+
+async def price_bulk_request(bulk_request: BulkOrderRequest, request: Request) -> BulkOrderResponse:
+
     try:
         if not Memory.customers:
             raise HTTPException(status_code=400, detail="No customers found. Please load sample data first.")
@@ -286,6 +638,8 @@ async def calculate_bulk_prices(bulk_request: BulkOrderRequest):
         if not Memory.products:
             raise HTTPException(status_code=400, detail="No products found. Please load sample data first.")
         
+        admission.check_size(len(bulk_request.orders))
+        
         # Convert orders to dictionary format
         orders_dict = []
         for order in bulk_request.orders:
@@ -295,74 +649,457 @@ async def calculate_bulk_prices(bulk_request: BulkOrderRequest):
                 "quantity": order.quantity
             })
         
-        # Get data in dictionary format for price calculator
+        # Pricing runs on the bounded bulk executor so the event loop stays responsive
+        deadline = request_deadline(request)
+        async with cancel_on_disconnect(request, deadline):
+            return await bulk_executor.run(price_bulk_orders, orders_dict, deadline)
+        
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except ExecutorFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calculating bulk prices: {str(e)}")
+
+def price_bulk_orders_fast(request_body: bytes, deadline) -> tuple:
+    # Bulk pricing without per-order Pydantic models, decoded and encoded on the bulk executor
+    # so large bodies do not hold up the event loop. Returns (body, partial marker or None)
+    with span("decode"):
+        orders_dict = decode_bulk_orders(request_body, lanes.yield_to_interactive)
+    admission.check_size(len(orders_dict))
+    
+    with span("materialize"):
         customers_dict = Memory.get_all_customers()
         products_dict = Memory.get_all_products()
+    
+    with span("evaluate"):
+        results = find_best_applicable_price_batch(orders_dict, products_dict, customers_dict, batch_checkpoint(deadline))
+    record_pricing("fast", results)
+    
+    with span("store"):
+        store_priced_orders(orders_dict, results)
+    
+    partial = partial_results(deadline, len(results), len(orders_dict))
+    with span("build_response"):
+        return encode_bulk_response(results, partial, lanes.yield_to_interactive), partial
+
+@app.post("/calculate-bulk-prices/fast", response_model=BulkOrderResponse, response_model_exclude_none=True)
+@traced_endpoint
+async def calculate_bulk_prices_fast(request: Request, idempotency_key: Optional[str] = Header(None)):
+    # Same request and response bodies as /calculate-bulk-prices, decoded and encoded without models
+    request_body = await request.body()
+    headers = {}
+    body, partial = await run_idempotent(
+        "calculate-bulk-prices/fast", idempotency_key, lambda: request_body, headers,
+        lambda: price_bulk_body_fast(request_body, request), cacheable=lambda result: result[1] is None
+    )
+    if partial is not None:
+        headers[PARTIAL_HEADER] = partial["reason"]
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def price_bulk_body_fast(request_body: bytes, request: Request) -> tuple:
+
+    try:
+        if not Memory.customers:
+            raise HTTPException(status_code=400, detail="No customers found. Please load sample data first.")
         
-        # Calculate best prices
-        results = find_best_applicable_price(orders_dict, products_dict, customers_dict)
-        
-        # Store orders and results in memory
-        for order_dict, result in zip(orders_dict, results):
-            Memory.add_order(order_dict['customer_id'], order_dict['product_id'], order_dict['quantity'])
-            Memory.add_result(result['product_id'], result['price'], result['price_type'])
+        if not Memory.products:
+            raise HTTPException(status_code=400, detail="No products found. Please load sample data first.")
         
-        # Convert results to response format
-        response_results = []
-        for result in results:
-            response_results.append(OrderResponse(
-                product_id=result['product_id'],
-                price=result['price'],
-                price_type=result['price_type']
-            ))
+        deadline = request_deadline(request)
+        async with cancel_on_disconnect(request, deadline):
+            return await bulk_executor.run(price_bulk_orders_fast, request_body, deadline)
         
-        return BulkOrderResponse(
-            results=response_results,
-            total_orders=len(results)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except OrderDecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ExecutorFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calculating bulk prices: {str(e)}")
+
+def price_bulk_columns(customer_ids, product_ids, quantities, deadline) -> tuple:
+    # Columns go straight into the column pricing path and come back as packed columns.
+    # Returns (body, partial marker or None); a partial body holds the leading orders only.
+    with span("materialize"):
+        customers_dict = Memory.get_all_customers()
+        products_dict = Memory.get_all_products()
+    
+    with span("evaluate"):
+        results = find_best_applicable_price_columns(
+            customer_ids, product_ids, quantities, products_dict, customers_dict, batch_checkpoint(deadline)
         )
+    record_pricing("columnar", results)
+    
+    with span("store"):
+        for start in range(0, len(results), STOP_CHECK_INTERVAL):
+            lanes.yield_to_interactive()
+            end = start + STOP_CHECK_INTERVAL
+            orders = (
+                {"customer_id": customer_id, "product_id": product_id, "quantity": quantity}
+                for customer_id, product_id, quantity in zip(customer_ids[start:end], product_ids[start:end], quantities[start:end])
+            )
+            Memory.add_order_results(orders, results[start:end])
+    
+    partial = partial_results(deadline, len(results), len(customer_ids))
+    with span("build_response"):
+        return encode_columnar_results(results), partial
+
+@app.post("/calculate-bulk-prices/columnar")
+@traced_endpoint
+async def calculate_bulk_prices_columnar(request: Request):
+    # Packed little-endian columns in and out, see api/codec.py for the layout
+    try:
+        if not Memory.customers:
+            raise HTTPException(status_code=400, detail="No customers found. Please load sample data first.")
+        
+        if not Memory.products:
+            raise HTTPException(status_code=400, detail="No products found. Please load sample data first.")
         
+        request_body = await request.body()
+        with span("decode"):
+            customer_ids, product_ids, quantities = decode_columnar_orders(request_body)
+        admission.check_size(len(customer_ids))
+        
+        deadline = request_deadline(request)
+        async with cancel_on_disconnect(request, deadline):
+            body, partial = await bulk_executor.run(price_bulk_columns, customer_ids, product_ids, quantities, deadline)
+        headers = {PARTIAL_HEADER: partial["reason"]} if partial is not None else None
+        return Response(content=body, media_type=COLUMNAR_MEDIA_TYPE, headers=headers)
+        
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except OrderDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ExecutorFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calculating bulk prices: {str(e)}")
 
+@app.post("/calculate-bulk-prices/stream")
+@traced_endpoint
+async def stream_bulk_prices(request: Request):
+    # Price newline-delimited JSON orders as they arrive and stream NDJSON results back
+    if not Memory.customers:
+        raise HTTPException(status_code=400, detail="No customers found. Please load sample data first.")
+    
+    if not Memory.products:
+        raise HTTPException(status_code=400, detail="No products found. Please load sample data first.")
+    
+    # Catalog is materialized once per request, orders are never held beyond one chunk
+    with span("materialize"):
+        customers_dict = Memory.get_all_customers()
+        products_dict = Memory.get_all_products()
+    
+    def price_stream_chunk(orders_dict, entries):
+        # Chunks are no larger than the batch checkpoint interval, so yield once per chunk
+        lanes.yield_to_interactive()
+        with span("evaluate"):
+            results = find_best_applicable_price(orders_dict, products_dict, customers_dict)
+        record_pricing("stream", results)
+        
+        with span("store"):
+            Memory.add_order_results(orders_dict, results)
+        
+        # Keep output lines in the same order as the input lines
+        with span("build_response"):
+            results = iter(results)
+            output = []
+            for entry in entries:
+                if entry is not None:
+                    output.append(entry)
+                    continue
+                result = next(results)
+                output.append(OrderResponse(
+                    product_id=result['product_id'],
+                    price=result['price'],
+                    price_type=result['price_type']
+                ).model_dump_json())
+        return output
+    
+    deadline = request_deadline(request)
+    
+    async def price_stream():
+        line_number = 0
+        try:
+            async for chunk in iter_chunks(iter_ndjson_lines(request), admission.stream_chunk_size):
+                # Checked between chunks. NDJSONStreamingResponse does not watch for a disconnect,
+                # so a client leaving mid-upload ends the stream through the ClientDisconnect the
+                # body reader raises, caught below; once the body is read, the last chunk is priced.
+                # Error lines use the same compact encoding as result lines.
+                if deadline.should_stop():
+                    deadlines.record_partial(deadline)
+                    yield render_json({
+                        "line": line_number,
+                        "error": f"Deadline exceeded, orders after line {line_number} were not priced",
+                        "partial": deadline.reason
+                    }) + b"\n"
+                    return
+                orders_dict = []
+                entries = []  # One per line: error line, or None for a valid order
+                with span("decode"):
+                    for line_number, line in chunk:
+                        try:
+                            order = OrderRequest.model_validate_json(line)
+                        except ValidationError as e:
+                            entries.append(render_json({"line": line_number, "error": f"Invalid order: {e.errors()[0]['msg']}"}).decode())
+                            continue
+                        entries.append(None)
+                        orders_dict.append({
+                            "customer_id": order.customer_id,
+                            "product_id": order.product_id,
+                            "quantity": order.quantity
+                        })
+                
+                output = await bulk_executor.run(price_stream_chunk, orders_dict, entries)
+                yield ("\n".join(output) + "\n").encode()
+        except Exception as e:
+            # Headers are already sent, so report the failure in-band and stop
+            yield render_json({"line": line_number, "error": f"Error calculating bulk prices: {str(e)}"}) + b"\n"
+    
+    return NDJSONStreamingResponse(price_stream())
+
+def summarize_chunk(summary: PriceSummary, lines: List[tuple], deadline) -> tuple:
+    # Decode and price one chunk of (line number, line) pairs into the running summary; nothing is stored.
+    # Returns (invalid lines, orders decoded, orders priced).
+    lanes.yield_to_interactive()
+    orders_dict = []
+    invalid_lines = 0
+    with span("decode"):
+        for line_number, line in lines:
+            try:
+                orders_dict.append(decode_order(loads(line), f"line {line_number}"))
+            except ValueError:
+                invalid_lines += 1
+    
+    with span("evaluate"):
+        before = summary.price_type_counts()
+        priced = summary.add(orders_dict, deadline.should_stop)
+    after = summary.price_type_counts()
+    record_price_type_counts("summary", {
+        price_type: count - before.get(price_type, 0) for price_type, count in after.items()
+    })
+    return invalid_lines, len(orders_dict), priced
+
+@app.post("/calculate-bulk-prices/summary", response_model=BulkSummaryResponse, response_model_exclude_none=True)
+@traced_endpoint
+async def summarize_bulk_prices(request: Request, response: Response):
+    # Price newline-delimited JSON orders as they arrive and return only aggregate totals.
+    # No per-order result is built and nothing is added to the order and result history.
+    try:
+        if not Memory.customers:
+            raise HTTPException(status_code=400, detail="No customers found. Please load sample data first.")
+        
+        if not Memory.products:
+            raise HTTPException(status_code=400, detail="No products found. Please load sample data first.")
+        
+        with span("materialize"):
+            summary = PriceSummary(Memory.get_all_products(), Memory.get_all_customers())
+        
+        deadline = request_deadline(request)
+        invalid_lines = 0
+        received_orders = 0
+        priced_orders = 0
+        stopped = False
+        async for chunk in iter_chunks(iter_ndjson_lines(request), admission.stream_chunk_size):
+            if deadline.should_stop():
+                stopped = True
+                break
+            chunk_invalid, chunk_orders, chunk_priced = await bulk_executor.run(
+                summarize_chunk, summary, chunk, deadline
+            )
+            invalid_lines += chunk_invalid
+            received_orders += chunk_orders
+            priced_orders += chunk_priced
+            if chunk_priced < chunk_orders:
+                stopped = True
+                break
+        
+        result = summary.to_dict()
+        result["invalid_lines"] = invalid_lines
+        if stopped:
+            # Orders still unread when pricing stopped are not counted as requested
+            deadlines.record_partial(deadline)
+            result["partial"] = {"reason": deadline.reason, "priced_orders": priced_orders, "requested_orders": received_orders}
+            response.headers[PARTIAL_HEADER] = deadline.reason
+        return result
+        
+    except ExecutorFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error summarizing bulk prices: {str(e)}")
+
+def product_info(product_data) -> ProductInfo:
+    product, tier_prices, group_prices = product_data
+    return ProductInfo(
+        product_id=product.product_id,
+        name=product.name,
+        base_price=product.base_price,
+        tier_prices_count=len(tier_prices),
+        group_prices_count=len(group_prices)
+    )
+
+# CustomerInfo / ProductInfo fields, in model order, built straight from the store entry so a
+# projection only computes the fields it returns. Unprojected output matches model_dump().
+CUSTOMER_FIELDS = {
+    "customer_id": lambda customer, loyalty_prices: customer.customer_id,
+    "name": lambda customer, loyalty_prices: customer.name,
+    "tier": lambda customer, loyalty_prices: customer.tier.value,
+    "groups": lambda customer, loyalty_prices: [group.value for group in customer.groups],
+    "loyalty_products_count": lambda customer, loyalty_prices: len(loyalty_prices)
+}
+
+PRODUCT_FIELDS = {
+    "product_id": lambda product, tier_prices, group_prices: product.product_id,
+    "name": lambda product, tier_prices, group_prices: product.name,
+    "base_price": lambda product, tier_prices, group_prices: float(product.base_price),
+    "tier_prices_count": lambda product, tier_prices, group_prices: len(tier_prices),
+    "group_prices_count": lambda product, tier_prices, group_prices: len(group_prices)
+}
+
+def parse_fields(fields: Optional[str], available: Dict[str, Any]) -> List[str]:
+    # "name,tier" -> the requested field names in model order; every field when not given
+    if fields is None:
+        return list(available)
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - available.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Available fields: {', '.join(available)}"
+        )
+    if not requested:
+        raise HTTPException(status_code=400, detail="fields must name at least one field")
+    return [name for name in available if name in requested]
+
+def project_customer(customer_data, fields: List[str]) -> Dict[str, Any]:
+    return {name: CUSTOMER_FIELDS[name](*customer_data) for name in fields}
+
+def project_product(product_data, fields: List[str]) -> Dict[str, Any]:
+    return {name: PRODUCT_FIELDS[name](*product_data) for name in fields}
+
+CUSTOMERS_PAGE_LIMIT = 1000
+CUSTOMERS_MAX_PAGE_LIMIT = 10000
+NEXT_AFTER_HEADER = "Next-After"
+
+def enum_value(enum_type, name: str, label: str) -> str:
+    # Case-insensitive lookup of a Tier / Group query parameter; 400 when it names no member
+    for member in enum_type:
+        if member.value.upper() == name.upper():
+            return member.value
+    raise HTTPException(
+        status_code=400,
+        detail=f"Unknown {label}: {name}. Available: {', '.join(member.value for member in enum_type)}"
+    )
+
 @app.get("/customers", response_model=List[CustomerInfo])
-async def get_customers():
-    # Get all customers with their information
-    try:
-        customers_info = []
-        for customer_data in Memory.customers:
-            customer, loyalty_prices = customer_data
-            customers_info.append(CustomerInfo(
-                customer_id=customer.customer_id,
-                name=customer.name,
-                tier=customer.tier.value,
-                groups=[group.value for group in customer.groups],
-                loyalty_products_count=len(loyalty_prices)
+async def get_customers(
+    request: Request,
+    fields: Optional[str] = Query(None),
+    tier: Optional[str] = None,
+    group: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=CUSTOMERS_MAX_PAGE_LIMIT),
+    after: Optional[int] = Query(None, ge=0)
+):
+    # Get all customers with their information, cached per store generation and projection.
+    # With tier, group, limit or after, return one page of matching customers in customer_id
+    # order from the customer indexes; a full page carries the cursor of the next one.
+    try:
+        selected = parse_fields(fields, CUSTOMER_FIELDS)
+        if tier is None and group is None and limit is None and after is None:
+            return catalog_cache.respond(request, Memory.generation, lambda: render_json(
+                [project_customer(customer_data, selected) for customer_data in Memory.customers]
             ))
         
-        return customers_info
+        limit = limit or CUSTOMERS_PAGE_LIMIT
+        page = Memory.query_customers(
+            tier=enum_value(Tier, tier, "tier") if tier is not None else None,
+            group=enum_value(Group, group, "group") if group is not None else None,
+            after=after or 0,
+            limit=limit
+        )
+        response = catalog_cache.respond(request, Memory.generation, lambda: render_json(
+            [project_customer(customer_data, selected) for customer_data in page]
+        ))
+        if len(page) == limit:
+            response.headers[NEXT_AFTER_HEADER] = str(page[-1][0].customer_id)
+        return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving customers: {str(e)}")
 
 @app.get("/products", response_model=List[ProductInfo])
-async def get_products():
-    # Get all products with their information
-    try:
-        products_info = []
-        for product_data in Memory.products:
-            product, tier_prices, group_prices = product_data
-            products_info.append(ProductInfo(
-                product_id=product.product_id,
-                name=product.name,
-                base_price=product.base_price,
-                tier_prices_count=len(tier_prices),
-                group_prices_count=len(group_prices)
-            ))
+async def get_products(request: Request, fields: Optional[str] = Query(None)):
+    # Get all products with their information, cached per store generation and projection
+    try:
+        selected = parse_fields(fields, PRODUCT_FIELDS)
+        return catalog_cache.respond(request, Memory.generation, lambda: render_json(
+            [project_product(product_data, selected) for product_data in Memory.products]
+        ))
         
-        return products_info
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving products: {str(e)}")
+
+@app.post("/customers:batchGet")
+async def batch_get_customers(batch: BatchGetRequest, fields: Optional[str] = Query(None)):
+    # Many customers in one call, in request order; ids that do not exist are listed in not_found
+    try:
+        selected = parse_fields(fields, CUSTOMER_FIELDS)
+        found = Memory.get_customers_by_ids(batch.ids)
+        customers = []
+        not_found = []
+        for customer_id in dict.fromkeys(batch.ids):
+            customer_data = found.get(customer_id)
+            if customer_data is None:
+                not_found.append(customer_id)
+            else:
+                customers.append(project_customer(customer_data, selected))
+        return Response(
+            content=render_json({"customers": customers, "not_found": not_found}),
+            media_type="application/json",
+            headers={"ETag": catalog_cache.etag(Memory.generation)}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving customers: {str(e)}")
+
+@app.post("/products:batchGet")
+async def batch_get_products(batch: BatchGetRequest, fields: Optional[str] = Query(None)):
+    # Many products in one call, in request order; ids that do not exist are listed in not_found
+    try:
+        selected = parse_fields(fields, PRODUCT_FIELDS)
+        found = Memory.get_products_by_ids(batch.ids)
+        products = []
+        not_found = []
+        for product_id in dict.fromkeys(batch.ids):
+            product_data = found.get(product_id)
+            if product_data is None:
+                not_found.append(product_id)
+            else:
+                products.append(project_product(product_data, selected))
+        return Response(
+            content=render_json({"products": products, "not_found": not_found}),
+            media_type="application/json",
+            headers={"ETag": catalog_cache.etag(Memory.generation)}
+        )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving products: {str(e)}")
 
@@ -381,8 +1118,118 @@ async def get_status():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving status: {str(e)}")
 
+def cache_lookups():
+    # (cache, hits, misses); 304s and waits on an in-flight idempotent call count as hits
+    return [
+        ("catalog", catalog_cache.hits + catalog_cache.not_modified, catalog_cache.misses),
+        ("idempotency", idempotency_cache.hits + idempotency_cache.waits, idempotency_cache.misses)
+    ]
+
+registry.register(CallbackMetric(
+    "pricing_store_size", "Entries held in the in-memory store.", "gauge", ("store",),
+    lambda: [(("customers",), len(Memory.customers)), (("products",), len(Memory.products)),
+             (("orders",), len(Memory.orders)), (("results",), len(Memory.results))]
+))
+registry.register(CallbackMetric(
+    "pricing_store_generation", "Catalog generation, bumped on every customer, product or rule change.", "gauge", (),
+    lambda: [((), Memory.generation)]
+))
+registry.register(CallbackMetric(
+    "pricing_cache_hits_total", "Cache hits by cache.", "counter", ("cache",),
+    lambda: [((name,), hits) for name, hits, misses in cache_lookups()]
+))
+registry.register(CallbackMetric(
+    "pricing_cache_misses_total", "Cache misses by cache.", "counter", ("cache",),
+    lambda: [((name,), misses) for name, hits, misses in cache_lookups()]
+))
+registry.register(CallbackMetric(
+    "pricing_cache_hit_ratio", "Fraction of cache lookups that were hits.", "gauge", ("cache",),
+    lambda: [((name,), hits / (hits + misses) if hits + misses else 0.0) for name, hits, misses in cache_lookups()]
+))
+registry.register(CallbackMetric(
+    "pricing_slow_requests_total", "Requests slower than PRICING_SLOW_REQUEST_MS.", "counter", (),
+    lambda: [((), tracer.slow_requests)]
+))
+registry.register(CallbackMetric(
+    "pricing_socket_connections", "Open connections to the Unix socket pricing server.", "gauge", (),
+    lambda: [((), socket_server.open_connections)]
+))
+registry.register(CallbackMetric(
+    "pricing_socket_frames_total", "Request frames answered by the Unix socket pricing server.", "counter", (),
+    lambda: [((), socket_server.frames)]
+))
+registry.register(CallbackMetric(
+    "pricing_quotes_held", "Unexpired quotes held in memory.", "gauge", (),
+    lambda: [((), quote_store.stats()["held"])]
+))
+registry.register(CallbackMetric(
+    "pricing_quotes_total", "Quotes by outcome.", "counter", ("outcome",),
+    lambda: [((outcome,), quote_store.stats()[outcome]) for outcome in ("issued", "redeemed", "expired", "spilled", "dropped", "rejected")]
+))
+registry.register(CallbackMetric(
+    "pricing_admission_inflight_orders", "Orders admitted for pricing and not yet finished.", "gauge", (),
+    lambda: [((), admission.in_flight_orders)]
+))
+registry.register(CallbackMetric(
+    "pricing_admission_waiting_requests", "Pricing requests waiting for admission.", "gauge", (),
+    lambda: [((), admission.stats()["waiting"])]
+))
+registry.register(CallbackMetric(
+    "pricing_admission_rejections_total", "Pricing requests rejected by admission control.", "counter", ("reason",),
+    lambda: [(("queue_full",), admission.rejected_queue_full), (("timeout",), admission.rejected_timeout),
+             (("too_large",), admission.rejected_too_large)]
+))
+registry.register(CallbackMetric(
+    "pricing_partial_responses_total", "Bulk pricing responses cut short before every order was priced.", "counter", ("reason",),
+    lambda: [((reason,), count) for reason, count in deadlines.stats()["partial_responses"].items()]
+))
+registry.register(CallbackMetric(
+    "pricing_audit_queue_depth", "Order and result records waiting for the audit writer.", "gauge", (),
+    lambda: [((), audit_log.stats()["queue_depth"])]
+))
+registry.register(CallbackMetric(
+    "pricing_audit_records_total", "Priced orders (order and result pairs) by audit outcome.", "counter", ("outcome",),
+    lambda: [(("written",), audit_log.written), (("dropped",), audit_log.dropped)]
+))
+registry.register(CallbackMetric(
+    "pricing_audit_fsyncs_total", "fsync calls made by the audit writer.", "counter", (),
+    lambda: [((), audit_log.fsyncs)]
+))
+registry.register(CallbackMetric(
+    "pricing_executor_queue_depth", "Tasks waiting for a pricing thread.", "gauge", ("executor",),
+    lambda: [((executor.name,), executor.stats()["queue_depth"]) for executor in (interactive_executor, bulk_executor)]
+))
+registry.register(CallbackMetric(
+    "pricing_batch_yield_seconds_total", "Time batch pricing spent yielding to interactive pricing.", "counter", (),
+    lambda: [((), lanes.stats()["batch_yield_ms"] / 1000)]
+))
+
+@app.get("/metrics")
+async def get_metrics():
+    # Prometheus text exposition of request, pricing, cache and store metrics
+    return Response(content=registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/status/executors")
+async def get_executor_status():
+    # Queue depth and wait time of the pricing executors and lanes, plus admission, deadline, audit, coalescing, tracing, change feed, replication, socket server and quote stats
+    return {
+        "interactive": interactive_executor.stats(),
+        "bulk": bulk_executor.stats(),
+        "lanes": lanes.stats(),
+        "coalescer": price_coalescer.stats(),
+        "admission": admission.stats(),
+        "deadlines": deadlines.stats(),
+        "audit": audit_log.stats(),
+        "tracing": tracer.stats(),
+        "change_feed": change_feed.stats(),
+        "replication": replication_log.stats(),
+        "socket": socket_server.stats(),
+        "quotes": quote_store.stats()
+    }
+
 # CRUD Operations for Customers
 @app.post("/customers", response_model=CustomerInfo)
+@replicated_write
 async def create_customer(customer_data: CustomerCreate):
 
     try:
@@ -412,21 +1259,17 @@ async def create_customer(customer_data: CustomerCreate):
         raise HTTPException(status_code=500, detail=f"Error creating customer: {str(e)}")
 
 @app.get("/customers/{customer_id}", response_model=CustomerInfo)
-async def get_customer(customer_id: int):
+async def get_customer(customer_id: int, request: Request, fields: Optional[str] = Query(None)):
 
-    try:
+    def render():
         customer_data = Memory.get_customer_by_id(customer_id)
         if not customer_data:
             raise HTTPException(status_code=404, detail="Customer not found")
-        
-        customer, loyalty_prices = customer_data
-        return CustomerInfo(
-            customer_id=customer.customer_id,
-            name=customer.name,
-            tier=customer.tier.value,
-            groups=[group.value for group in customer.groups],
-            loyalty_products_count=len(loyalty_prices)
-        )
+        return render_json(project_customer(customer_data, selected))
+
+    try:
+        selected = parse_fields(fields, CUSTOMER_FIELDS)
+        return catalog_cache.respond(request, Memory.generation, render)
         
     except HTTPException:
         raise
@@ -434,6 +1277,7 @@ async def get_customer(customer_id: int):
         raise HTTPException(status_code=500, detail=f"Error retrieving customer: {str(e)}")
 
 @app.delete("/customers/{customer_id}")
+@replicated_write
 async def delete_customer(customer_id: int):
 
     try:
@@ -442,7 +1286,7 @@ async def delete_customer(customer_id: int):
             raise HTTPException(status_code=404, detail="Customer not found")
         
         # Remove customer from memory
-        Memory.customers = [c for c in Memory.customers if c[0].customer_id != customer_id]
+        Memory.delete_customer(customer_id)
         
         return {"message": f"Customer {customer_id} deleted successfully"}
         
@@ -453,6 +1297,7 @@ async def delete_customer(customer_id: int):
 
 # CRUD Operations for Products
 @app.post("/products", response_model=ProductInfo)
+@replicated_write
 async def create_product(product_data: ProductCreate):
 
     try:
@@ -476,28 +1321,42 @@ async def create_product(product_data: ProductCreate):
         raise HTTPException(status_code=500, detail=f"Error creating product: {str(e)}")
 
 @app.get("/products/{product_id}", response_model=ProductInfo)
-async def get_product(product_id: int):
+async def get_product(product_id: int, request: Request, fields: Optional[str] = Query(None)):
 
-    try:
+    def render():
         product_data = Memory.get_product_by_id(product_id)
         if not product_data:
             raise HTTPException(status_code=404, detail="Product not found")
-        
-        product, tier_prices, group_prices = product_data
-        return ProductInfo(
-            product_id=product.product_id,
-            name=product.name,
-            base_price=product.base_price,
-            tier_prices_count=len(tier_prices),
-            group_prices_count=len(group_prices)
-        )
+        return render_json(project_product(product_data, selected))
+
+    try:
+        selected = parse_fields(fields, PRODUCT_FIELDS)
+        return catalog_cache.respond(request, Memory.generation, render)
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving product: {str(e)}")
 
+@app.patch("/products/{product_id}", response_model=ProductInfo)
+@replicated_write
+async def update_product(product_id: int, update: ProductUpdate):
+
+    try:
+        if not Memory.get_product_by_id(product_id):
+            raise HTTPException(status_code=404, detail="Product not found")
+        
+        Memory.update_product(product_id, name=update.name, base_price=update.base_price)
+        
+        return product_info(Memory.get_product_by_id(product_id))
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating product: {str(e)}")
+
 @app.delete("/products/{product_id}")
+@replicated_write
 async def delete_product(product_id: int):
 
     try:
@@ -506,7 +1365,7 @@ async def delete_product(product_id: int):
             raise HTTPException(status_code=404, detail="Product not found")
         
         # Remove product from memory
-        Memory.products = [p for p in Memory.products if p[0].product_id != product_id]
+        Memory.delete_product(product_id)
         
         return {"message": f"Product {product_id} deleted successfully"}
         
@@ -517,6 +1376,7 @@ async def delete_product(product_id: int):
 
 # Pricing Rules Management
 @app.post("/products/{product_id}/tier-prices")
+@replicated_write
 async def add_tier_price_rule(product_id: int, rule: TierPriceRule):
 
     try:
@@ -541,7 +1401,7 @@ async def add_tier_price_rule(product_id: int, rule: TierPriceRule):
             "discount_rate": rule.discount_rate,
             "min_qty": rule.min_qty
         }
-        tier_prices.append(tier_rule)
+        Memory.add_tier_price(product_id, tier_rule)
         
         return {"message": f"Tier pricing rule added for {tier.value}"}
         
@@ -553,6 +1413,7 @@ async def add_tier_price_rule(product_id: int, rule: TierPriceRule):
         raise HTTPException(status_code=500, detail=f"Error adding tier pricing rule: {str(e)}")
 
 @app.post("/products/{product_id}/group-prices")
+@replicated_write
 async def add_group_price_rule(product_id: int, rule: GroupPriceRule):
 
     try:
@@ -577,7 +1438,7 @@ async def add_group_price_rule(product_id: int, rule: GroupPriceRule):
             "discount_rate": rule.discount_rate,
             "min_qty": rule.min_qty
         }
-        group_prices.append(group_rule)
+        Memory.add_group_price(product_id, group_rule)
         
         return {"message": f"Group pricing rule added for {group.value}"}
         
@@ -589,6 +1450,7 @@ async def add_group_price_rule(product_id: int, rule: GroupPriceRule):
         raise HTTPException(status_code=500, detail=f"Error adding group pricing rule: {str(e)}")
 
 @app.post("/customers/{customer_id}/loyalty-prices")
+@replicated_write
 async def add_loyalty_price_rule(customer_id: int, rule: LoyaltyPriceRule):
 
     try:
@@ -614,7 +1476,7 @@ async def add_loyalty_price_rule(customer_id: int, rule: LoyaltyPriceRule):
             "discount_rate": rule.discount_rate,
             "min_qty": rule.min_qty
         }
-        loyalty_prices.append(loyalty_rule)
+        Memory.add_loyalty_price(customer_id, loyalty_rule)
         
         return {"message": f"Loyalty pricing rule added for product {rule.product_id}"}
         
@@ -623,36 +1485,321 @@ async def add_loyalty_price_rule(customer_id: int, rule: LoyaltyPriceRule):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error adding loyalty pricing rule: {str(e)}")
 
+# Accepted spellings (upper-cased) of tiers and groups in rule changesets, mapped to stored values
+RULE_TIERS = {tier.value.upper(): tier.value for tier in Tier}
+RULE_GROUPS = {**{group.name: group.value for group in Group}, **{group.value.upper(): group.value for group in Group}}
+
+def normalize_rule_change(change: RuleChange) -> Dict[str, Any]:
+    # Validate one changeset item into the rule dict stored in Memory, or an item error
+    if change.op not in ("upsert", "delete"):
+        return {"error": f"Unknown op '{change.op}', expected 'upsert' or 'delete'"}
+    
+    if change.kind == "tier":
+        if change.tier is None:
+            return {"error": "tier is required for tier rules"}
+        tier = RULE_TIERS.get(change.tier.upper())
+        if tier is None:
+            return {"error": f"Invalid tier: {change.tier}"}
+        rule = {"product_id": change.product_id, "tier": tier}
+    elif change.kind == "group":
+        if change.group is None:
+            return {"error": "group is required for group rules"}
+        group = RULE_GROUPS.get(change.group.upper())
+        if group is None:
+            return {"error": f"Invalid group: {change.group}"}
+        rule = {"product_id": change.product_id, "group": group}
+    elif change.kind == "loyalty":
+        if change.customer_id is None:
+            return {"error": "customer_id is required for loyalty rules"}
+        rule = {"customer_id": change.customer_id, "product_id": change.product_id}
+    else:
+        return {"error": f"Unknown kind '{change.kind}', expected 'tier', 'group' or 'loyalty'"}
+    
+    if change.op == "upsert":
+        if change.discount_rate is None or change.min_qty is None:
+            return {"error": "discount_rate and min_qty are required for upserts"}
+        rule["discount_rate"] = change.discount_rate
+        rule["min_qty"] = change.min_qty
+    
+    return {"op": change.op, "kind": change.kind, "rule": rule}
+
+@app.post("/pricing-rules/batch")
+@replicated_write
+async def apply_rule_changeset(changeset: RuleChangeset):
+    # Upsert and delete many tier, group and loyalty rules with a single catalog change
+    try:
+        changes = [normalize_rule_change(change) for change in changeset.changes]
+        outcomes = Memory.apply_rule_changes(changes, atomic=changeset.atomic)
+        
+        summary = {}
+        results = []
+        for index, outcome in enumerate(outcomes):
+            summary[outcome["status"]] = summary.get(outcome["status"], 0) + 1
+            results.append({"index": index, **outcome})
+        
+        if changeset.atomic and "error" in summary:
+            raise HTTPException(status_code=422, detail={
+                "message": f"{summary['error']} of {len(results)} changes are invalid, nothing was applied",
+                "summary": summary,
+                "results": results
+            })
+        
+        # Rendered directly, a 300k item results list is slow through jsonable_encoder
+        return Response(content=render_json({
+            "applied": any(status in summary for status in ("created", "updated", "deleted")),
+            "generation": Memory.generation,
+            "summary": summary,
+            "results": results
+        }), media_type="application/json")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error applying pricing rule changes: {str(e)}")
+
+# Change Feed
+CHANGES_PAGE_LIMIT = 1000
+CHANGE_STREAM_HEARTBEAT_SECONDS = 15
+# Streams end after this long and the client resumes with Last-Event-ID; uvicorn waits for open
+# responses on shutdown, so an endless stream would keep the server from stopping
+CHANGE_STREAM_MAX_SECONDS = 60
+
+@app.get("/changes")
+async def get_changes(after: int = Query(0, ge=0), limit: int = Query(CHANGES_PAGE_LIMIT, ge=1, le=CHANGES_PAGE_LIMIT)):
+    # Catalog and pricing rule change events after sequence `after`; pass next_after back to continue
+    try:
+        events, resync = change_feed.read(after, limit)
+        return {
+            "events": events,
+            "resync": resync,
+            "next_after": events[-1]["seq"] if events else (change_feed.last_seq if resync else after),
+            "last_seq": change_feed.last_seq
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving changes: {str(e)}")
+
+@app.get("/changes/stream")
+async def stream_changes(after: Optional[int] = Query(None, ge=0), last_event_id: Optional[str] = Header(None)):
+    # Server-Sent Events feed of change events. Resumes after `after` or the Last-Event-ID a
+    # reconnecting EventSource sends; without either it starts with the next change.
+    if after is None:
+        try:
+            after = int(last_event_id) if last_event_id else change_feed.last_seq
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Last-Event-ID must be a change sequence number")
+    
+    async def event_stream():
+        position = after
+        deadline = time.monotonic() + CHANGE_STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            events, resync = change_feed.read(position, CHANGES_PAGE_LIMIT)
+            if resync:
+                # Events the client missed are gone; it must refetch the catalog and continue from here
+                position = change_feed.last_seq
+                yield sse_event(json.dumps({"last_seq": position}), event="resync", event_id=position)
+                continue
+            for event in events:
+                yield sse_event(json.dumps(event, separators=(",", ":")), event=event["type"], event_id=event["seq"])
+            if events:
+                position = events[-1]["seq"]
+            elif not await change_feed.wait(position, min(CHANGE_STREAM_HEARTBEAT_SECONDS, max(deadline - time.monotonic(), 0))):
+                yield b": keep-alive\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def price_ladder(customer_id: int, product_id: int) -> PriceLadder:
+    # Quantity ranges with their best price, from one evaluation per rule threshold
+    products_dict = [p for p in Memory.get_all_products() if p["product_id"] == product_id]
+    customers_dict = [c for c in Memory.get_all_customers() if c["customer_id"] == customer_id]
+    quantities, results = find_price_breakpoints(customer_id, product_id, products_dict, customers_dict)
+    
+    steps = []
+    for index, (quantity, result) in enumerate(zip(quantities, results)):
+        # Quantities below the first threshold share the first result
+        min_quantity = max(quantity, 1) if index else 1
+        max_quantity = quantities[index + 1] - 1 if index + 1 < len(quantities) else None
+        if max_quantity is not None and max_quantity < min_quantity:
+            continue
+        price_type = getattr(result["price_type"], "value", result["price_type"])
+        # Adjacent ranges with the same outcome are one step
+        if steps and steps[-1].price == result["price"] and steps[-1].price_type == price_type:
+            steps[-1].max_quantity = max_quantity
+            continue
+        steps.append(LadderStep(
+            min_quantity=min_quantity,
+            max_quantity=max_quantity,
+            price=result["price"],
+            price_type=price_type
+        ))
+    
+    return PriceLadder(
+        customer_id=customer_id,
+        product_id=results[0]["product_id"],
+        base_price=products_dict[0]["base_price"],
+        steps=steps
+    )
+
+@app.get("/customers/{customer_id}/products/{product_id}/ladder", response_model=PriceLadder)
+async def get_price_ladder(customer_id: int, product_id: int, request: Request):
+    # Best price at every quantity as ranges; nothing is recorded in order history
+
+    def render():
+        if not Memory.get_customer_by_id(customer_id):
+            raise HTTPException(status_code=404, detail="Customer not found")
+        if not Memory.get_product_by_id(product_id):
+            raise HTTPException(status_code=404, detail="Product not found")
+        return render_json(price_ladder(customer_id, product_id).model_dump())
+
+    try:
+        return catalog_cache.respond(request, Memory.generation, render)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error calculating price ladder: {str(e)}")
+
 # Order Management
-@app.get("/orders")
-async def get_orders():
+HISTORY_PAGE_LIMIT = 100
+HISTORY_MAX_PAGE_LIMIT = 1000
 
+@app.get("/orders")
+async def get_orders(
+    limit: int = Query(HISTORY_PAGE_LIMIT, ge=1, le=HISTORY_MAX_PAGE_LIMIT),
+    after: int = Query(0, ge=0),
+    customer_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    price_type: Optional[str] = None
+):
+    # Page through order history; pass next_after back as `after` to continue or tail
     try:
+        order_ids = Memory.query_history(
+            after=after, limit=limit, customer_id=customer_id, product_id=product_id,
+            price_type=price_type.upper() if price_type else None
+        )
+        
         orders_with_ids = []
-        for i, order in enumerate(Memory.orders, 1):
+        for order_id in order_ids:
+            order = Memory.history[order_id - 1][0]
             orders_with_ids.append({
-                "order_id": i,
+                "order_id": order_id,
                 "customer_id": order['customer_id'],
                 "product_id": order['product_id'],
                 "quantity": order['quantity'],
                 "timestamp": "2025-09-29T00:00:00"  # Mock timestamp
             })
         
-        return {"orders": orders_with_ids, "total_orders": len(orders_with_ids)}
+        return {
+            "orders": orders_with_ids,
+            "total_orders": len(Memory.history),
+            "next_after": order_ids[-1] if order_ids else after
+        }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving orders: {str(e)}")
 
 @app.get("/results")
-async def get_results():
-
+async def get_results(
+    limit: int = Query(HISTORY_PAGE_LIMIT, ge=1, le=HISTORY_MAX_PAGE_LIMIT),
+    after: int = Query(0, ge=0),
+    customer_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    price_type: Optional[str] = None
+):
+    # Page through calculation results with the same cursor and filters as /orders
     try:
-        return {"results": Memory.results, "total_results": len(Memory.results)}
+        result_ids = Memory.query_history(
+            after=after, limit=limit, customer_id=customer_id, product_id=product_id,
+            price_type=price_type.upper() if price_type else None
+        )
+        
+        return {
+            "results": [Memory.history[result_id - 1][1] for result_id in result_ids],
+            "total_results": len(Memory.history),
+            "next_after": result_ids[-1] if result_ids else after
+        }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving results: {str(e)}")
 
+# Bulk Pricing Jobs
+@app.post("/jobs", status_code=202)
+async def create_job(job_request: JobCreate):
+    # Start a pricing job from inline orders or an NDJSON order file on the server
+    try:
+        if (job_request.orders is None) == (job_request.source_path is None):
+            raise HTTPException(status_code=400, detail="Provide exactly one of 'orders' or 'source_path'")
+        
+        if job_request.orders is not None:
+            job = job_manager.submit(orders=[order.model_dump() for order in job_request.orders])
+        else:
+            job = job_manager.submit(input_path=job_manager.resolve_input(job_request.source_path))
+        
+        return job.to_dict()
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating job: {str(e)}")
+
+@app.post("/jobs/upload", status_code=202)
+async def upload_job(request: Request):
+    # Start a pricing job from an uploaded NDJSON body, spooled to disk as it arrives
+    try:
+        job_id, input_path = job_manager.new_upload_path()
+        try:
+            with open(input_path, "wb") as input_file:
+                async for chunk in request.stream():
+                    input_file.write(chunk)
+        except BaseException:
+            job_manager.discard_upload(job_id)
+            raise
+        
+        return job_manager.submit(job_id=job_id, input_path=input_path).to_dict()
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating job: {str(e)}")
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    # Job status, progress and throughput
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/results")
+async def get_job_results(job_id: str, page: int = Query(0, ge=0)):
+    # One page of job results; pages become available while the job is still running
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    pages_available = len(job.page_ends)
+    if page >= pages_available:
+        raise HTTPException(status_code=404, detail=f"Page {page} is not available ({pages_available} pages ready, job {job.status})")
+    
+    return {
+        "job_id": job_id,
+        "page": page,
+        "results": job_manager.read_page(job, page),
+        "next_page": page + 1 if page + 1 < pages_available or job.status in ("queued", "running") else None
+    }
+
+@app.get("/jobs/{job_id}/results/file")
+async def download_job_results(job_id: str):
+    # Full NDJSON results file of a completed job
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return FileResponse(job.results_path, media_type="application/x-ndjson", filename=f"{job_id}.results.ndjson")
+
 @app.delete("/clear-data")
+@replicated_write
 async def clear_data():
     # Clear all data from memory
     try:
@@ -0,0 +1,231 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as TallyCounter, deque
+from typing import Callable, Dict, Iterable, List, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette appends the charset
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float], labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple, list] = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labelvalues, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, labelvalues, f'le="{_format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, labelvalues)
+                lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    # Gauge or counter whose samples are read from the application at scrape time
+
+    def __init__(self, name: str, documentation: str, metric_type: str, labelnames: Iterable[str],
+                 collect: Callable[[], Iterable[Tuple[Tuple, float]]]):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for labelvalues, value in self.collect():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class RateWindow:
+    # Events per second over the last `window` seconds, kept as one bucket per second
+
+    def __init__(self, window: int = 60):
+        self.window = window
+        self._buckets = deque()  # [second, count]
+        self._lock = threading.Lock()
+
+    def add(self, amount: int):
+        second = int(time.monotonic())
+        with self._lock:
+            if self._buckets and self._buckets[-1][0] == second:
+                self._buckets[-1][1] += amount
+            else:
+                self._buckets.append([second, amount])
+            self._trim(second)
+
+    def rate(self) -> float:
+        second = int(time.monotonic())
+        with self._lock:
+            self._trim(second)
+            return sum(count for _, count in self._buckets) / self.window
+
+    def _trim(self, second: int):
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.register(Counter(
+    "pricing_http_requests_total", "HTTP requests by method, route and status code.", ("method", "route", "status")
+))
+http_latency = registry.register(Histogram(
+    "pricing_http_request_duration_seconds", "HTTP request latency by method and route.", LATENCY_BUCKETS, ("method", "route")
+))
+batch_sizes = registry.register(Histogram(
+    "pricing_batch_size_orders", "Orders per pricing batch by pricing mode.", BATCH_SIZE_BUCKETS, ("mode",)
+))
+orders_priced = registry.register(Counter(
+    "pricing_orders_priced_total", "Orders priced by pricing mode.", ("mode",)
+))
+price_type_wins = registry.register(Counter(
+    "pricing_price_type_total", "Priced orders by winning price type.", ("price_type",)
+))
+lane_queue_time = registry.register(Histogram(
+    "pricing_lane_queue_seconds", "Time pricing work waited for an executor thread by priority lane.", LATENCY_BUCKETS, ("lane",)
+))
+orders_rate = RateWindow()
+registry.register(CallbackMetric(
+    "pricing_orders_per_second", "Orders priced per second over the last minute.", "gauge", (),
+    lambda: [((), orders_rate.rate())]
+))
+
+
+def record_pricing(mode: str, results: List[dict]):
+    # Batch size, order count and price-type tallies for one priced batch
+    count = len(results)
+    batch_sizes.observe(count, mode)
+    orders_priced.inc(mode, amount=count)
+    orders_rate.add(count)
+    tally = TallyCounter(result["price_type"] for result in results)
+    for price_type, wins in tally.items():
+        price_type_wins.inc(getattr(price_type, "value", price_type), amount=wins)
+
+
+def record_price_type_counts(mode: str, price_type_counts: dict):
+    # Same series as record_pricing, for batches that were only counted, not materialized
+    count = sum(price_type_counts.values())
+    batch_sizes.observe(count, mode)
+    orders_priced.inc(mode, amount=count)
+    orders_rate.add(count)
+    for price_type, wins in price_type_counts.items():
+        price_type_wins.inc(price_type, amount=wins)
+
+
+class MetricsMiddleware:
+    # Pure ASGI middleware: one counter increment and one histogram observation per request
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths = None
+
+    def _route_path(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._route_paths is None:
+            app = scope["app"]
+            self._route_paths = {route.endpoint: route.path for route in app.routes if hasattr(route, "endpoint")}
+        return self._route_paths.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = self._route_path(scope)
+            http_requests.inc(scope["method"], route, status[0])
+            http_latency.observe(time.perf_counter() - start, scope["method"], route)
@@ -0,0 +1,223 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("pricing.quotes")
+
+class QuoteError(Exception):
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class QuoteStore:
+    # Prices locked at quote time, for checkout to confirm without pricing the order again.
+    # A quote token is "<payload>.<signature>": the base64url JSON quote and its HMAC-SHA256
+    # under the store's secret, so a client can read the price and expiry but not change them.
+    # Redeeming checks the signature and expiry, then looks the quote up by id: one dict lookup.
+    # Quotes are held until they expire, at most max_entries of them in memory. All quotes
+    # share one TTL, so insertion order is expiry order and eviction pops from the front. When
+    # memory is full the oldest quote is written to the spill file (SQLite) if one is set,
+    # otherwise it is dropped and can no longer be redeemed. A quote can be redeemed once.
+    # Opened as shared, for workers kept in step by the replication log, every quote is written
+    # to the spill file instead and redeemed there with one conditional UPDATE, so any worker
+    # can redeem any quote, and only once; that needs the same secret in every worker.
+    # Workers that cannot share quotes turn them off instead, and answer 503.
+
+    def __init__(self, ttl_seconds: float, max_entries: int, spill_path: str, secret: str):
+        if max_entries < 1:
+            raise ValueError("PRICING_QUOTE_MAX_ENTRIES must be at least 1")
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.spill_path = spill_path
+        # Without a configured secret, tokens are only valid for the lifetime of this process
+        self._configured_secret = bool(secret)
+        self._secret = secret.encode() if secret else secrets.token_bytes(32)
+        self._quotes = OrderedDict()  # quote_id -> quote, oldest first
+        self._redeemed = set()
+        self._spill = None
+        self.shared = False
+        self.unavailable = None  # Why quotes are turned off, or None
+        self.issued = 0
+        self.redeemed = 0
+        self.expired = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def open(self, shared: bool = False):
+        if shared and not self._configured_secret:
+            raise ValueError("PRICING_QUOTE_SECRET must be set when several workers redeem quotes")
+        if shared and not self.spill_path:
+            raise ValueError("PRICING_QUOTE_SPILL_PATH must be set when several workers redeem quotes")
+        self.shared = shared
+        directory = os.path.dirname(self.spill_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Quotes live no longer than their TTL, so the file is not synced on every commit
+        self._spill = sqlite3.connect(self.spill_path, isolation_level=None, check_same_thread=False, timeout=5)
+        self._spill.execute("PRAGMA journal_mode=WAL")
+        self._spill.execute("PRAGMA synchronous=NORMAL")
+        self._spill.execute(
+            "CREATE TABLE IF NOT EXISTS quotes (id TEXT PRIMARY KEY, expires_at REAL, quote TEXT, redeemed INTEGER)"
+        )
+        self._spill.execute("CREATE INDEX IF NOT EXISTS quotes_expires_at ON quotes (expires_at)")
+        self._spill.execute("DELETE FROM quotes WHERE expires_at <= ?", (time.time(),))
+
+    @property
+    def shareable(self) -> bool:
+        return self._configured_secret and bool(self.spill_path)
+
+    def disable(self, reason: str):
+        self.unavailable = reason
+        logger.warning("Quotes are turned off: %s", reason)
+
+    def check_available(self):
+        if self.unavailable is not None:
+            raise QuoteError(503, f"Quotes are not available: {self.unavailable}")
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def issue(self, order: dict, result: dict) -> dict:
+        # Lock the price of an order; returns the quote with its token
+        self.check_available()
+        now = time.time()
+        self._evict(now)
+        price_type = result["price_type"]
+        quote = {
+            "quote_id": secrets.token_hex(12),
+            "order": order,
+            "product_id": result["product_id"],
+            "price": result["price"],
+            "price_type": getattr(price_type, "value", price_type),
+            "issued_at": now,
+            "expires_at": now + self.ttl
+        }
+        if self.shared:
+            self._store(quote, redeemed=False)
+        else:
+            while len(self._quotes) >= self.max_entries:
+                self._spill_oldest()
+            self._quotes[quote["quote_id"]] = quote
+        self.issued += 1
+        return {**quote, "token": self._sign(quote)}
+
+    def redeem(self, token: str) -> dict:
+        # The locked quote, marked redeemed; raises QuoteError when it cannot be redeemed
+        self.check_available()
+        quote = self._verify(token)
+        now = time.time()
+        self._evict(now)
+        if quote["expires_at"] <= now:
+            self.rejected += 1
+            raise QuoteError(410, "Quote has expired")
+        quote_id = quote["quote_id"]
+        if quote_id in self._quotes:
+            if quote_id in self._redeemed:
+                self.rejected += 1
+                raise QuoteError(409, "Quote has already been redeemed")
+            self._redeemed.add(quote_id)
+        elif not self._redeem_stored(quote_id):
+            self.rejected += 1
+            raise QuoteError(410, "Quote is no longer held")
+        self.redeemed += 1
+        return {**quote, "redeemed_at": now}
+
+    def _sign(self, quote: dict) -> str:
+        payload = _b64encode(json.dumps(quote, separators=(",", ":")).encode())
+        signature = hmac.new(self._secret, payload.encode(), hashlib.sha256).digest()
+        return f"{payload}.{_b64encode(signature)}"
+
+    def _verify(self, token: str) -> dict:
+        payload, _, signature = token.partition(".")
+        try:
+            expected = hmac.new(self._secret, payload.encode(), hashlib.sha256).digest()
+            if not hmac.compare_digest(expected, _b64decode(signature)):
+                raise ValueError("bad signature")
+            return json.loads(_b64decode(payload))
+        except ValueError:
+            self.rejected += 1
+            raise QuoteError(400, "Invalid quote token")
+
+    def _evict(self, now: float):
+        while self._quotes:
+            quote_id, quote = next(iter(self._quotes.items()))
+            if quote["expires_at"] > now:
+                break
+            del self._quotes[quote_id]
+            self._redeemed.discard(quote_id)
+            self.expired += 1
+
+    def _spill_oldest(self):
+        quote_id, quote = self._quotes.popitem(last=False)
+        redeemed = quote_id in self._redeemed
+        self._redeemed.discard(quote_id)
+        if self._spill is None:
+            self.dropped += 1
+            return
+        self._store(quote, redeemed)
+        self.spilled += 1
+
+    def _store(self, quote: dict, redeemed: bool):
+        # Drop stored quotes that have expired, found through the expires_at index
+        self._spill.execute("DELETE FROM quotes WHERE expires_at <= ?", (time.time(),))
+        self._spill.execute(
+            "INSERT OR REPLACE INTO quotes VALUES (?, ?, ?, ?)",
+            (quote["quote_id"], quote["expires_at"], json.dumps(quote), int(redeemed))
+        )
+
+    def _redeem_stored(self, quote_id: str) -> bool:
+        # False when the quote is not in the spill file. The conditional UPDATE is atomic
+        # across processes, so of concurrent redeems of one quote exactly one succeeds.
+        if self._spill is None:
+            return False
+        if self._spill.execute("UPDATE quotes SET redeemed = 1 WHERE id = ? AND redeemed = 0", (quote_id,)).rowcount:
+            return True
+        if self._spill.execute("SELECT 1 FROM quotes WHERE id = ?", (quote_id,)).fetchone() is None:
+            return False
+        self.rejected += 1
+        raise QuoteError(409, "Quote has already been redeemed")
+
+    def stats(self) -> dict:
+        return {
+            "ttl_seconds": self.ttl,
+            "held": len(self._quotes),
+            "max_entries": self.max_entries,
+            "spill_path": self.spill_path or None,
+            "shared": self.shared,
+            "unavailable": self.unavailable,
+            "issued": self.issued,
+            "redeemed": self.redeemed,
+            "expired": self.expired,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "rejected": self.rejected
+        }
+
+
+quote_store = QuoteStore(
+    ttl_seconds=float(os.environ.get("PRICING_QUOTE_TTL_SECONDS", "900")),
+    max_entries=int(os.environ.get("PRICING_QUOTE_MAX_ENTRIES", "100000")),
+    spill_path=os.environ.get("PRICING_QUOTE_SPILL_PATH", ""),
+    secret=os.environ.get("PRICING_QUOTE_SECRET", "")
+)
@@ -0,0 +1,261 @@
+import asyncio
+import contextvars
+import fcntl
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+from fastapi import HTTPException
+
+from data.memory import Memory
+from data.change_feed import change_feed
+from models.customer import Customer
+from models.product import Product
+from constants.group import Group
+from constants.tier import Tier
+
+RULE_EVENTS = {"rule.upserted": "upsert", "rule.deleted": "delete"}
+
+# Change events captured by the replicated write running in this context. A contextvar rather
+# than a thread-local, so a write that awaits, or hands work to a thread, still captures its
+# own events and never another request's.
+_write_events = contextvars.ContextVar("replication_write_events", default=None)
+
+
+class ReplicationBusyError(Exception):
+    pass
+
+
+class ReplicationLog:
+    # Keeps the catalog of every uvicorn worker in step through one shared append-only log.
+    # A mutating request holds an exclusive flock on the log while it catches up, mutates its
+    # own Memory and appends the change events that produced, so the log order is the order
+    # every worker applies mutations in. Workers replay records they have not seen before
+    # serving a request and on a short poll, and adopt the writer's generation with each record.
+    # The event loop never blocks on the flock: writes poll for it and give up with 503 after
+    # lock_wait_ms, and catch up under it on a thread. Order/result history stays per worker.
+
+    def __init__(self, path: str, poll_ms: float, lock_wait_ms: float):
+        self.path = path
+        self.poll = poll_ms / 1000
+        self.lock_wait = lock_wait_ms / 1000
+        self.log_id = None
+        self._fd = None
+        self._offset = 0
+        self._lock = threading.RLock()  # Guards _offset and replay between the loop and threads
+        self._write_lock = None  # asyncio.Lock, one write at a time in this process
+        self.records_applied = 0
+        self.records_written = 0
+        self.busy_rejections = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._fd is not None
+
+    def open(self):
+        # Open (creating if needed) the log and replay it into Memory
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        with self._flock():
+            if os.fstat(self._fd).st_size == 0:
+                self.log_id = uuid.uuid4().hex[:8]
+                self._append({"log_id": self.log_id})
+            self._catch_up()
+        self._write_lock = asyncio.Lock()
+        change_feed.add_listener(self._capture)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    @contextmanager
+    def _flock(self):
+        # Blocking; only for startup, before the event loop serves requests
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    async def _acquire_flock(self, deadline: float):
+        delay = 0.001
+        while True:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    self.busy_rejections += 1
+                    raise ReplicationBusyError(
+                        f"Another worker held the replication log for over {self.lock_wait * 1000:.0f}ms"
+                    )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 0.05)
+
+    def _catch_up_locked(self):
+        with self._lock:
+            self._catch_up()
+
+    @asynccontextmanager
+    async def write(self):
+        # Run a block of Memory mutations as one replicated record
+        if not self.enabled:
+            yield
+            return
+        deadline = time.monotonic() + self.lock_wait
+        try:
+            await asyncio.wait_for(self._write_lock.acquire(), self.lock_wait)
+        except asyncio.TimeoutError:
+            self.busy_rejections += 1
+            raise ReplicationBusyError(f"Replicated writes on this worker did not free up within {self.lock_wait * 1000:.0f}ms")
+        try:
+            await self._acquire_flock(deadline)
+            try:
+                # Replaying another worker's large changeset must not hold up the event loop
+                await asyncio.to_thread(self._catch_up_locked)
+                token = _write_events.set([])
+                try:
+                    yield
+                finally:
+                    events = _write_events.get()
+                    _write_events.reset(token)
+                    # Logged even when the block failed part way, since whatever it changed is applied here
+                    if events:
+                        self._append({"generation": Memory.generation, "pid": os.getpid(), "events": events})
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            self._write_lock.release()
+
+    def _capture(self, events: list, generation: int):
+        captured = _write_events.get()
+        if captured is not None:
+            captured.extend([event_type, data] for event_type, data in events)
+
+    def _append(self, record: dict):
+        with self._lock:
+            os.write(self._fd, (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8"))
+            self._offset = os.fstat(self._fd).st_size
+            self.records_written += 1
+
+    def catch_up(self):
+        # Cheap when nothing new was written: one fstat. Skipped while a write replays the
+        # log on a thread, rather than waiting for it on the event loop.
+        if self.enabled and os.fstat(self._fd).st_size > self._offset:
+            if self._lock.acquire(blocking=False):
+                try:
+                    self._catch_up()
+                finally:
+                    self._lock.release()
+
+    def _catch_up(self):
+        size = os.fstat(self._fd).st_size
+        if size <= self._offset:
+            return
+        data = os.pread(self._fd, size - self._offset, self._offset)
+        # Only whole lines; a record still being appended is picked up next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line:
+                self._apply(json.loads(line))
+        self._offset += end
+
+    def _apply(self, record: dict):
+        if "log_id" in record:
+            self.log_id = record["log_id"]
+            return
+
+        rule_changes = []
+        for event_type, data in record["events"]:
+            if event_type in RULE_EVENTS:
+                rule_changes.append({"op": RULE_EVENTS[event_type], "kind": data["kind"], "rule": data["rule"]})
+                continue
+            # Consecutive rule events are applied as one changeset
+            if rule_changes:
+                Memory.apply_rule_changes(rule_changes)
+                rule_changes = []
+            apply_event(event_type, data)
+        if rule_changes:
+            Memory.apply_rule_changes(rule_changes)
+
+        Memory.generation = record["generation"]
+        self.records_applied += 1
+
+    async def follow(self):
+        # Background catch-up so idle workers (and their change feed readers) stay current
+        while self.enabled:
+            self.catch_up()
+            await asyncio.sleep(self.poll)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "path": self.path if self.enabled else None,
+            "log_id": self.log_id,
+            "offset": self._offset,
+            "records_applied": self.records_applied,
+            "records_written": self.records_written,
+            "busy_rejections": self.busy_rejections
+        }
+
+
+def apply_event(event_type: str, data: dict):
+    # Replay one non-rule change event against Memory
+    if event_type == "customer.created":
+        customer = Customer(data["customer_id"], data["name"], Tier(data["tier"]), [Group(group) for group in data["groups"]])
+        Memory.add_customer_with_loyalty(customer, list(data["loyalty_prices"]))
+    elif event_type == "customer.deleted":
+        Memory.delete_customer(data["customer_id"])
+    elif event_type == "product.created":
+        product = Product(data["product_id"], data["name"], data["base_price"])
+        Memory.add_product_with_pricing(product, list(data["tier_prices"]), list(data["group_prices"]))
+    elif event_type == "product.deleted":
+        Memory.delete_product(data["product_id"])
+    elif event_type == "product.base_price_changed":
+        Memory.update_product(data["product_id"], base_price=data["base_price"])
+    elif event_type == "product.renamed":
+        Memory.update_product(data["product_id"], name=data["name"])
+    elif event_type == "catalog.cleared":
+        Memory.clear_all()
+    else:
+        raise ValueError(f"Unknown change event type: {event_type}")
+
+
+def replicated_write(endpoint):
+    # Endpoint decorator: the whole endpoint runs as one replicated write, or gets 503 when
+    # the log stays locked by another worker for longer than PRICING_REPLICATION_LOCK_WAIT_MS
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        try:
+            async with replication_log.write():
+                return await endpoint(*args, **kwargs)
+        except ReplicationBusyError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return wrapper
+
+
+class ReplicationMiddleware:
+    # Pure ASGI middleware applying records from other workers before each request is served
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            replication_log.catch_up()
+        await self.app(scope, receive, send)
+
+
+replication_log = ReplicationLog(
+    path=os.environ.get("PRICING_REPLICATION_LOG", ""),
+    poll_ms=float(os.environ.get("PRICING_REPLICATION_POLL_MS", "200")),
+    lock_wait_ms=float(os.environ.get("PRICING_REPLICATION_LOCK_WAIT_MS", "5000"))
+)
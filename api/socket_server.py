@@ -0,0 +1,310 @@
+import asyncio
+import errno
+import os
+import socket
+import stat
+import struct
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from constants.price import PriceType
+from data.memory import Memory
+from price_calculator import PriceLookup
+from api.codec import decode_columnar_orders, encode_columnar_results, OrderDecodeError, PRICE_TYPE_CODES
+from api.executor import bulk_executor, ExecutorFullError
+from api.metrics import record_pricing
+
+# Length-prefixed frames, all values little-endian:
+#   request:  uint32 length | uint32 request_id | uint8 op     | body
+#   response: uint32 length | uint32 request_id | uint8 status | body
+# length counts the bytes after itself. A connection may pipeline any number of requests;
+# they are answered in the order they were sent, each echoing its request_id.
+#   OP_PING        body: empty                                              -> empty
+#   OP_PRICE       body: int32 customer_id | int32 product_id | int32 quantity -> float64 price | uint8 price_type
+#   OP_PRICE_BULK  body: columnar request (see api/codec.py)                 -> columnar response
+# price_type uses the columnar codes (0 NORMAL, 1 TIER, 2 GROUP, 3 CUSTOMER, 255 ERROR).
+# A STATUS_ERROR response carries a UTF-8 message instead.
+OP_PING = 0
+OP_PRICE = 1
+OP_PRICE_BULK = 2
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+READ_SIZE = 256 * 1024
+_REQUEST_HEADER = struct.Struct("<IIB")
+_ORDER = struct.Struct("<iii")
+_PRICE_REQUEST = struct.Struct("<IIBiii")
+_PRICE_RESPONSE = struct.Struct("<IIBdB")
+_STATUS_RESPONSE = struct.Struct("<IIB")
+# Result price types are PriceType members, or "ERROR"
+_PRICE_TYPE_CODES = {price_type: PRICE_TYPE_CODES[price_type.value] for price_type in PriceType}
+_PRICE_TYPE_CODES["ERROR"] = PRICE_TYPE_CODES["ERROR"]
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def price_request(request_id: int, customer_id: int, product_id: int, quantity: int) -> bytes:
+    return _PRICE_REQUEST.pack(_PRICE_REQUEST.size - 4, request_id, OP_PRICE, customer_id, product_id, quantity)
+
+
+def frame(request_id: int, code: int, body: bytes = b"") -> bytes:
+    # One request (code: op) or response (code: status) frame
+    return _STATUS_RESPONSE.pack(_STATUS_RESPONSE.size - 4 + len(body), request_id, code) + body
+
+
+def read_frames(buffer: bytearray, max_frame_bytes: int) -> list:
+    # Remove the complete frames at the front of buffer, as (request_id, code, body)
+    frames = []
+    offset = 0
+    while len(buffer) - offset >= _REQUEST_HEADER.size:
+        length, request_id, code = _REQUEST_HEADER.unpack_from(buffer, offset)
+        if not _REQUEST_HEADER.size - 4 <= length <= max_frame_bytes:
+            raise ProtocolError(f"Frame length must be between {_REQUEST_HEADER.size - 4} and {max_frame_bytes} bytes, got {length}")
+        end = offset + 4 + length
+        if len(buffer) < end:
+            break
+        frames.append((request_id, code, bytes(buffer[offset + _REQUEST_HEADER.size:end])))
+        offset = end
+    del buffer[:offset]
+    return frames
+
+
+def decode_price(body: bytes) -> tuple:
+    # (price, price type code) of an OP_PRICE response
+    return struct.unpack("<dB", body)
+
+
+class SocketPricingServer:
+    # Serves single and bulk pricing over a Unix domain socket, on the event loop of the
+    # process it runs in, so it prices against the same Memory as the FastAPI app. Single
+    # lookups are priced inline against a PriceLookup kept per catalog generation; every frame
+    # that arrived in one read is answered with one write. Bulk frames go to the bulk executor.
+    # Priced orders are recorded in the order and result history like /calculate-price.
+
+    def __init__(self, path: str, max_frame_bytes: int):
+        self.path = path
+        self.max_frame_bytes = max_frame_bytes
+        self.bound_path = None
+        self._server = None
+        self._inode = None
+        self._lookup = None
+        self._lookup_generation = None
+        self.open_connections = 0
+        self.connections = 0
+        self.frames = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._server is not None
+
+    async def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        sock = self._bind()
+        self._server = await asyncio.start_unix_server(self._serve, sock=sock)
+        self._inode = os.stat(self.bound_path).st_ino
+
+    def _bind(self) -> socket.socket:
+        # Binds the configured path. A socket file left behind by a previous run is replaced,
+        # but one another process (such as another uvicorn worker) still serves on is kept,
+        # and this process listens on "<path>.<pid>" instead.
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            try:
+                sock.bind(self.path)
+                self.bound_path = self.path
+            except OSError as e:
+                if e.errno != errno.EADDRINUSE or not stat.S_ISSOCK(os.stat(self.path).st_mode):
+                    raise
+                if self._in_use(self.path):
+                    self.bound_path = f"{self.path}.{os.getpid()}"
+                else:
+                    os.unlink(self.path)
+                    self.bound_path = self.path
+                sock.bind(self.bound_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    @staticmethod
+    def _in_use(path: str) -> bool:
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+            return True
+        except ConnectionRefusedError:
+            return False
+        finally:
+            probe.close()
+
+    async def close(self):
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+        # Only remove the file this process bound, not one another process has put there since
+        try:
+            if os.stat(self.bound_path).st_ino == self._inode:
+                os.unlink(self.bound_path)
+        except FileNotFoundError:
+            pass
+        self.bound_path = None
+
+    def _current_lookup(self) -> PriceLookup:
+        if not Memory.customers:
+            raise ProtocolError("No customers found. Please load sample data first.")
+        if not Memory.products:
+            raise ProtocolError("No products found. Please load sample data first.")
+        if self._lookup is None or self._lookup_generation != Memory.generation:
+            self._lookup = PriceLookup(Memory.get_all_products(), Memory.get_all_customers())
+            self._lookup_generation = Memory.generation
+        return self._lookup
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self.open_connections += 1
+        buffer = bytearray()
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                buffer += data
+                output = []
+                priced = []
+                try:
+                    await self._answer_frames(buffer, output, priced)
+                except ProtocolError as e:
+                    # The stream can no longer be split into frames, so report it and hang up
+                    self.errors += 1
+                    output.append(frame(0, STATUS_ERROR, str(e).encode()))
+                    writer.write(b"".join(output))
+                    break
+                if priced:
+                    record_pricing("socket", priced)
+                if output:
+                    writer.write(b"".join(output))
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.open_connections -= 1
+            writer.close()
+
+    async def _answer_frames(self, buffer: bytearray, output: list, priced: list):
+        # Like read_frames, but well-formed single lookups are priced straight from the buffer
+        offset = 0
+        while len(buffer) - offset >= _REQUEST_HEADER.size:
+            length, request_id, op = _REQUEST_HEADER.unpack_from(buffer, offset)
+            if not _REQUEST_HEADER.size - 4 <= length <= self.max_frame_bytes:
+                raise ProtocolError(f"Frame length must be between {_REQUEST_HEADER.size - 4} and {self.max_frame_bytes} bytes, got {length}")
+            end = offset + 4 + length
+            if len(buffer) < end:
+                break
+            self.frames += 1
+            if op == OP_PRICE and length == _PRICE_REQUEST.size - 4:
+                output.append(self._price(request_id, *_ORDER.unpack_from(buffer, offset + _REQUEST_HEADER.size), priced))
+            else:
+                output.append(await self._answer(request_id, op, bytes(buffer[offset + _REQUEST_HEADER.size:end])))
+            offset = end
+        del buffer[:offset]
+
+    def _price(self, request_id: int, customer_id: int, product_id: int, quantity: int, priced: list) -> bytes:
+        try:
+            result = self._current_lookup().price(customer_id, product_id, quantity)
+        except ProtocolError as e:
+            self.errors += 1
+            return frame(request_id, STATUS_ERROR, str(e).encode())
+        Memory.add_order_result(customer_id, product_id, quantity, result)
+        priced.append(result)
+        return _PRICE_RESPONSE.pack(
+            _PRICE_RESPONSE.size - 4, request_id, STATUS_OK, result["price"], _PRICE_TYPE_CODES[result["price_type"]]
+        )
+
+    async def _answer(self, request_id: int, op: int, body: bytes) -> bytes:
+        try:
+            if op == OP_PRICE:
+                raise ProtocolError(f"Price request body must be {_ORDER.size} bytes, got {len(body)}")
+            if op == OP_PRICE_BULK:
+                customer_ids, product_ids, quantities = decode_columnar_orders(body)
+                lookup = self._current_lookup()
+                return frame(request_id, STATUS_OK, await bulk_executor.run(
+                    self._price_bulk, lookup, customer_ids, product_ids, quantities
+                ))
+            if op == OP_PING:
+                return frame(request_id, STATUS_OK)
+            raise ProtocolError(f"Unknown op {op}")
+
+        except (ProtocolError, OrderDecodeError, ExecutorFullError) as e:
+            self.errors += 1
+            return frame(request_id, STATUS_ERROR, str(e).encode())
+        except Exception as e:
+            self.errors += 1
+            return frame(request_id, STATUS_ERROR, f"Error calculating price: {str(e)}".encode())
+
+    @staticmethod
+    def _price_bulk(lookup: PriceLookup, customer_ids, product_ids, quantities) -> bytes:
+        orders = []
+        results = []
+        for customer_id, product_id, quantity in zip(customer_ids, product_ids, quantities):
+            orders.append({"customer_id": customer_id, "product_id": product_id, "quantity": quantity})
+            results.append(lookup.price(customer_id, product_id, quantity))
+        Memory.add_order_results(orders, results)
+        record_pricing("socket", results)
+        return encode_columnar_results(results)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "path": self.bound_path or self.path or None,
+            "open_connections": self.open_connections,
+            "connections": self.connections,
+            "frames": self.frames,
+            "errors": self.errors
+        }
+
+
+socket_server = SocketPricingServer(
+    path=os.environ.get("PRICING_SOCKET_PATH", ""),
+    max_frame_bytes=int(os.environ.get("PRICING_SOCKET_MAX_FRAME_BYTES", str(64 * 1024 * 1024)))
+)
+
+
+async def serve():
+    # Standalone entry point. A separate process has its own Memory, so it follows the
+    # catalog through PRICING_REPLICATION_LOG, like an extra uvicorn worker would.
+    from api.replication import replication_log
+
+    if not socket_server.path:
+        raise SystemExit("Set PRICING_SOCKET_PATH to the socket to listen on")
+    follow_task = None
+    if replication_log.path:
+        replication_log.open()
+        follow_task = asyncio.create_task(replication_log.follow())
+        print(f"Replicating catalog through {replication_log.path} (generation {Memory.generation})")
+    else:
+        print("PRICING_REPLICATION_LOG is not set, so the catalog starts and stays empty")
+    await socket_server.start()
+    print(f"Pricing socket server listening on {socket_server.bound_path}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await socket_server.close()
+        if follow_task is not None:
+            follow_task.cancel()
+            replication_log.close()
+        bulk_executor.shutdown()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,71 @@
+from typing import AsyncIterator, List, Tuple, TypeVar
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+# Orders priced per chunk when streaming NDJSON; bounds memory per request
+STREAM_CHUNK_SIZE = 1000
+MAX_LINE_BYTES = 64 * 1024
+
+T = TypeVar("T")
+
+
+async def iter_ndjson_lines(request: Request, max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[Tuple[int, bytes]]:
+    # Yield (line number, line) for the non-empty lines of a newline-delimited request body as
+    # they arrive. Blank lines are skipped but still counted, so numbers are physical lines.
+    buffer = bytearray()
+    line_number = 0
+    async for chunk in request.stream():
+        buffer.extend(chunk)
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end == -1:
+                break
+            line_number += 1
+            line = bytes(buffer[start:end]).strip()
+            if line:
+                yield line_number, line
+            start = end + 1
+        del buffer[:start]
+        if len(buffer) > max_line_bytes:
+            raise ValueError(f"NDJSON line {line_number + 1} exceeds {max_line_bytes} bytes")
+
+    line = bytes(buffer).strip()
+    if line:
+        yield line_number + 1, line
+
+
+async def iter_chunks(items: AsyncIterator[T], chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[List[T]]:
+    # Group streamed items into lists of at most chunk_size items
+    chunk = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    # StreamingResponse also listens on receive() for a disconnect, which would
+    # swallow request body messages still being read by the generator.
+    media_type = "application/x-ndjson"
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def sse_event(data: str, event: str = None, event_id: int = None) -> bytes:
+    # One Server-Sent Events message; data must not contain newlines (compact JSON does not)
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event is not None:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
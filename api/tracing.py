@@ -0,0 +1,210 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger("pricing.slow_requests")
+
+_current_trace = contextvars.ContextVar("pricing_trace", default=None)
+
+
+class Trace:
+    # Spans recorded while handling one HTTP request. Times are perf_counter values;
+    # spans may be added from executor threads, which list.append tolerates.
+
+    def __init__(self, method: str, path: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.route = None
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.handler_start = None
+        self.handler_end = None
+        self.spans = []  # (name, start, end)
+
+    def add_span(self, name: str, start: float, end: float):
+        self.spans.append((name, start, end))
+
+    def to_dict(self, status: int, end: float) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "timestamp": self.started_at,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": status,
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "spans": [
+                {
+                    "name": name,
+                    "start_ms": round((start - self.start) * 1000, 3),
+                    "duration_ms": round((span_end - start) * 1000, 3)
+                }
+                for name, start, span_end in sorted(self.spans, key=lambda span: span[1])
+            ]
+        }
+
+
+@contextmanager
+def span(name: str):
+    # Time a stage of the current request; a no-op when the request is not traced
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.perf_counter())
+
+
+def record_span(name: str, start: float, end: float):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(name, start, end)
+
+
+def traced_endpoint(endpoint):
+    # Marks when the endpoint body starts and returns, so the middleware can attribute the
+    # time before it to request parsing and the time after it to response serialization
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        trace = _current_trace.get()
+        if trace is None:
+            return await endpoint(*args, **kwargs)
+        trace.handler_start = time.perf_counter()
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            trace.handler_end = time.perf_counter()
+    return wrapper
+
+
+def stage_breakdown(trace_dict: dict) -> str:
+    # "request_parse=1.2ms evaluate=30.1ms(x3) ..." with repeated stages summed
+    totals = {}
+    for item in trace_dict["spans"]:
+        total, count = totals.get(item["name"], (0.0, 0))
+        totals[item["name"]] = (total + item["duration_ms"], count + 1)
+    return " ".join(
+        f"{name}={total:.1f}ms" + (f"(x{count})" if count > 1 else "")
+        for name, (total, count) in totals.items()
+    )
+
+
+class TraceExporter:
+    # Appends one JSON line per finished trace
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, trace_dict: dict):
+        line = json.dumps(trace_dict, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class RequestTracer:
+    # Collects a trace per request when an export file or a slow-request threshold is
+    # configured; otherwise requests are not traced at all
+
+    def __init__(self, export_path: Optional[str] = None, slow_ms: float = 0):
+        self.exporter = TraceExporter(export_path) if export_path else None
+        self.slow_ms = slow_ms
+        self.traced = 0
+        self.slow_requests = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None or self.slow_ms > 0
+
+    def finish(self, trace: Trace, status: int, end: float):
+        trace_dict = trace.to_dict(status, end)
+        self.traced += 1
+        if self.exporter is not None:
+            self.exporter.export(trace_dict)
+        if self.slow_ms > 0 and trace_dict["duration_ms"] >= self.slow_ms:
+            self.slow_requests += 1
+            logger.warning(
+                "Slow request %s %s %s took %.1fms [trace %s]: %s",
+                trace.method, trace.path, status, trace_dict["duration_ms"], trace.trace_id, stage_breakdown(trace_dict)
+            )
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "export_path": self.exporter.path if self.exporter is not None else None,
+            "slow_request_ms": self.slow_ms,
+            "traced_requests": self.traced,
+            "slow_requests": self.slow_requests
+        }
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+
+class TracingMiddleware:
+    # Pure ASGI middleware that opens a trace per request and hands it to the tracer when done
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths = None
+
+    def _route_path(self, scope) -> Optional[str]:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return None
+        if self._route_paths is None:
+            self._route_paths = {route.endpoint: route.path for route in scope["app"].routes if hasattr(route, "endpoint")}
+        return self._route_paths.get(endpoint)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope["method"], scope["path"])
+        token = _current_trace.set(trace)
+        status = [500]
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if trace.handler_end is not None:
+                    trace.add_span("response_serialize", trace.handler_end, time.perf_counter())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            _current_trace.reset(token)
+            end = time.perf_counter()
+            if trace.handler_start is not None:
+                trace.add_span("request_parse", trace.start, trace.handler_start)
+            trace.route = self._route_path(scope)
+            tracer.finish(trace, status[0], end)
+
+
+tracer = RequestTracer(
+    export_path=os.environ.get("PRICING_TRACE_FILE") or None,
+    slow_ms=float(os.environ.get("PRICING_SLOW_REQUEST_MS", "0"))
+)
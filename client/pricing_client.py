@@ -0,0 +1,287 @@
+import asyncio
+import functools
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_BASE_URL = "http://localhost:8000"
+# Statuses the API answers before doing any work (admission control, full executor queues),
+# so every method, POST included, can be retried on them
+RETRY_STATUSES = (429, 503)
+# Orders per /calculate-bulk-prices/fast request; well under the server's admission budget
+DEFAULT_CHUNK_SIZE = 10000
+
+
+class PricingAPIError(Exception):
+
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _chunks(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+class _NDJSONBody:
+    # Streamed request body that can be iterated again when the request is retried
+
+    def __init__(self, orders: Iterable[dict]):
+        self.orders = orders
+
+    def __iter__(self):
+        for order in self.orders:
+            yield (json.dumps(order, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class PricingClient:
+    # Client for the pricing API. One requests.Session holds a pool of keep-alive connections
+    # (pool_size per host). Requests rejected with 429 or 503 are retried up to `retries` times
+    # with exponential backoff, honouring Retry-After. Bulk pricing splits large order lists
+    # into chunk_size requests and sends up to `concurrency` of them at once over the pool.
+    # The session is shared by the fan-out threads, so keep one client per process.
+
+    def __init__(
+        self, base_url: str = DEFAULT_BASE_URL, pool_size: int = 8, retries: int = 3, backoff_factor: float = 0.2,
+        timeout: float = 30, chunk_size: int = DEFAULT_CHUNK_SIZE, concurrency: int = 4
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        # Connection failures are retried too, but never a request that may have reached the server
+        retry = Retry(
+            total=retries, connect=retries, read=0, status=retries, status_forcelist=RETRY_STATUSES,
+            allowed_methods=None, backoff_factor=backoff_factor, respect_retry_after_header=True, raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=max(concurrency, 1), thread_name_prefix="pricing-client")
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # Raw requests: responses are returned whatever their status, for callers that inspect it
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, self.base_url + path, **kwargs)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request("POST", path, **kwargs)
+
+    def patch(self, path: str, **kwargs) -> requests.Response:
+        return self.request("PATCH", path, **kwargs)
+
+    def delete(self, path: str, **kwargs) -> requests.Response:
+        return self.request("DELETE", path, **kwargs)
+
+    @staticmethod
+    def _json(response: requests.Response) -> Any:
+        if response.status_code >= 400:
+            try:
+                detail = response.json().get("detail", response.text)
+            except ValueError:
+                detail = response.text
+            raise PricingAPIError(response.status_code, detail)
+        return response.json()
+
+    def map(self, func, items: Iterable[Any]) -> List[Any]:
+        # Call func on every item, `concurrency` at a time over the shared connection pool
+        return list(self._pool.map(func, items))
+
+    # Typed calls: JSON bodies are returned, errors raise PricingAPIError
+    def health(self) -> dict:
+        return self._json(self.get("/health"))
+
+    def status(self) -> dict:
+        return self._json(self.get("/status"))
+
+    def load_sample_data(self) -> dict:
+        return self._json(self.post("/load-sample-data"))
+
+    def clear_data(self) -> dict:
+        return self._json(self.delete("/clear-data"))
+
+    def list_customers(self, **params) -> List[dict]:
+        return self._json(self.get("/customers", params=params))
+
+    def list_products(self, **params) -> List[dict]:
+        return self._json(self.get("/products", params=params))
+
+    def calculate_price(self, customer_id: int, product_id: int, quantity: int) -> dict:
+        return self._json(self.post(
+            "/calculate-price", json={"customer_id": customer_id, "product_id": product_id, "quantity": quantity}
+        ))
+
+    def create_quote(self, customer_id: int, product_id: int, quantity: int) -> dict:
+        return self._json(self.post(
+            "/quotes", json={"customer_id": customer_id, "product_id": product_id, "quantity": quantity}
+        ))
+
+    def redeem_quote(self, token: str) -> dict:
+        return self._json(self.post("/quotes/redeem", json={"token": token}))
+
+    def calculate_prices(self, orders: List[dict]) -> List[dict]:
+        # One /calculate-price call per order, fanned out; results are in order order
+        return self.map(
+            lambda order: self.calculate_price(order["customer_id"], order["product_id"], order["quantity"]), orders
+        )
+
+    def calculate_bulk_prices(
+        self, orders: List[dict], idempotency_key: Optional[str] = None, deadline_ms: Optional[float] = None
+    ) -> dict:
+        # Any number of orders, priced chunk_size at a time and merged into one BulkOrderResponse body.
+        # Once a chunk comes back partial, chunks not yet sent are skipped.
+        chunks = _chunks(orders, self.chunk_size)
+        stopped = threading.Event()
+
+        def price_chunk(index: int) -> Optional[dict]:
+            if stopped.is_set():
+                return None
+            body = self._price_chunk(chunks[index], self._bulk_headers(index, idempotency_key, deadline_ms))
+            if "partial" in body:
+                stopped.set()
+            return body
+
+        return self._merge_bulk(self.map(price_chunk, range(len(chunks))), len(orders))
+
+    def summarize_bulk_prices(self, orders: Iterable[dict], deadline_ms: Optional[float] = None) -> dict:
+        # Aggregate totals only; orders are streamed as NDJSON. A one-shot iterator is read into
+        # a list first, since a retried request has to send every order again.
+        if iter(orders) is orders:
+            orders = list(orders)
+        headers = {"Content-Type": "application/x-ndjson"}
+        if deadline_ms is not None:
+            headers["Deadline-Ms"] = str(deadline_ms)
+        return self._json(self.post("/calculate-bulk-prices/summary", data=_NDJSONBody(orders), headers=headers))
+
+    @staticmethod
+    def _bulk_headers(index: int, idempotency_key: Optional[str], deadline_ms: Optional[float]) -> Dict[str, str]:
+        headers = {}
+        if idempotency_key is not None:
+            # One key per chunk, so a retried chunk is replayed rather than priced twice
+            headers["Idempotency-Key"] = f"{idempotency_key}-{index}"
+        if deadline_ms is not None:
+            headers["Deadline-Ms"] = str(deadline_ms)
+        return headers
+
+    def _price_chunk(self, orders: List[dict], headers: Dict[str, str]) -> dict:
+        return self._json(self.post("/calculate-bulk-prices/fast", json={"orders": orders}, headers=headers))
+
+    @staticmethod
+    def _merge_bulk(bodies: List[Optional[dict]], requested_orders: int) -> dict:
+        # Chunk bodies in order, None for chunks skipped. Merging stops after the first partial
+        # or skipped chunk, so results[i] is always the price of orders[i] and a partial marker
+        # counts the leading orders priced, as in a partial response of the server.
+        reason = next((body["partial"]["reason"] for body in bodies if body is not None and "partial" in body), None)
+        results = []
+        for body in bodies:
+            if body is None:
+                break
+            results.extend(body["results"])
+            if "partial" in body:
+                break
+        merged = {"results": results, "total_orders": len(results)}
+        if reason is not None:
+            merged["partial"] = {"reason": reason, "priced_orders": len(results), "requested_orders": requested_orders}
+        return merged
+
+
+class AsyncPricingClient:
+    # asyncio front end of PricingClient: each call runs on a thread of its own pool, so
+    # coroutines can fan out over the same keep-alive connections with asyncio.gather.
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, **options):
+        self.client = PricingClient(base_url, **options)
+        self._executor = ThreadPoolExecutor(max_workers=self.client.pool_size, thread_name_prefix="pricing-async")
+
+    async def _call(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def close(self):
+        await self._call(self.client.close)
+        self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        return await self._call(self.client.request, method, path, **kwargs)
+
+    async def get(self, path: str, **kwargs) -> requests.Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> requests.Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def patch(self, path: str, **kwargs) -> requests.Response:
+        return await self.request("PATCH", path, **kwargs)
+
+    async def delete(self, path: str, **kwargs) -> requests.Response:
+        return await self.request("DELETE", path, **kwargs)
+
+    async def health(self) -> dict:
+        return await self._call(self.client.health)
+
+    async def load_sample_data(self) -> dict:
+        return await self._call(self.client.load_sample_data)
+
+    async def calculate_price(self, customer_id: int, product_id: int, quantity: int) -> dict:
+        return await self._call(self.client.calculate_price, customer_id, product_id, quantity)
+
+    async def create_quote(self, customer_id: int, product_id: int, quantity: int) -> dict:
+        return await self._call(self.client.create_quote, customer_id, product_id, quantity)
+
+    async def redeem_quote(self, token: str) -> dict:
+        return await self._call(self.client.redeem_quote, token)
+
+    async def calculate_prices(self, orders: List[dict]) -> List[dict]:
+        return list(await asyncio.gather(*(
+            self.calculate_price(order["customer_id"], order["product_id"], order["quantity"]) for order in orders
+        )))
+
+    async def calculate_bulk_prices(
+        self, orders: List[dict], idempotency_key: Optional[str] = None, deadline_ms: Optional[float] = None
+    ) -> dict:
+        client = self.client
+        chunks = _chunks(orders, client.chunk_size)
+        semaphore = asyncio.Semaphore(client.concurrency)
+        stopped = False
+
+        async def price_chunk(index: int, chunk: List[dict]) -> Optional[dict]:
+            nonlocal stopped
+            async with semaphore:
+                if stopped:
+                    return None
+                body = await self._call(client._price_chunk, chunk, client._bulk_headers(index, idempotency_key, deadline_ms))
+                if "partial" in body:
+                    stopped = True
+                return body
+
+        bodies = await asyncio.gather(*(price_chunk(index, chunk) for index, chunk in enumerate(chunks)))
+        return client._merge_bulk(list(bodies), len(orders))
+
+    async def summarize_bulk_prices(self, orders: Iterable[dict], deadline_ms: Optional[float] = None) -> dict:
+        return await self._call(self.client.summarize_bulk_prices, orders, deadline_ms)
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib encoder is used without it
+    orjson = None
+
+DURABILITY_MODES = ("batch", "periodic")
+OVERFLOW_POLICIES = ("block", "drop")
+
+
+def _dumps(batch: dict) -> bytes:
+    # Result price types may be PriceType members, which orjson writes as their value
+    if orjson is not None:
+        return orjson.dumps(batch)
+    return json.dumps(batch, separators=(",", ":"), default=lambda value: value.value).encode("utf-8")
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class AuditWriter:
+    # Appends every order and result recorded in Memory to a JSONL file, off the request path.
+    # Callers only append (order, result) pairs to one bounded in-memory queue, so the cost on
+    # the pricing path is one deque append per priced order. A writer thread polls the queue
+    # every poll_ms, drains up to max_batch pairs and writes them as one line,
+    #   {"batch": n, "ts": commit time, "orders": [...], "results": [...]}
+    # with one write(), committed by one fsync ("batch" durability, group commit) or at most
+    # one fsync per fsync_interval_ms ("periodic"). Pairs are queued and dropped whole, so the
+    # n-th order in a line always belongs to the n-th result. When the queue is full, pairs are
+    # either waited for ("block") or discarded and counted ("drop"). Callers on an event loop
+    # never wait, whatever the policy: their pairs are dropped, since waiting would stall every
+    # request served by that loop.
+
+    def __init__(
+        self, path: str, max_queue: int, max_batch: int, durability: str, fsync_interval_ms: float, overflow: str,
+        poll_ms: float = 5
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Audit durability must be one of {', '.join(DURABILITY_MODES)}")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Audit overflow policy must be one of {', '.join(OVERFLOW_POLICIES)}")
+        self.path = path
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.durability = durability
+        self.fsync_interval = fsync_interval_ms / 1000
+        self.overflow = overflow
+        self.poll = poll_ms / 1000
+        self._queue = deque()  # (order, result)
+        self._wake = threading.Event()
+        self._space = threading.Condition()
+        self._file = None
+        self._thread = None
+        self._stopping = False
+        self._last_fsync = 0.0
+        self._unsynced = False
+        self.written = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.errors = 0
+        self.last_error = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, order: dict, result: dict):
+        # Called from the pricing path for every priced order; cheap unless the queue is full
+        if self._thread is None:
+            return
+        if len(self._queue) >= self.max_queue and not self._wait_for_space():
+            return
+        self._queue.append((order, result))
+
+    def _wait_for_space(self) -> bool:
+        # False when the pair is to be dropped
+        with self._space:
+            if self.overflow == "drop" or _on_event_loop():
+                self.dropped += 1
+                return False
+            self.blocked += 1
+            self._wake.set()
+            while len(self._queue) >= self.max_queue and not self._stopping:
+                self._space.wait(0.1)
+            return True
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll)
+            self._wake.clear()
+            while self._queue:
+                self._write_batch()
+            if self._unsynced and time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._fsync()
+            if self._stopping and not self._queue:
+                return
+
+    def _write_batch(self):
+        queue = self._queue
+        pairs = [queue.popleft() for _ in range(min(len(queue), self.max_batch))]
+        batch = {
+            "batch": self.batches + 1,
+            "ts": time.time(),
+            "orders": [order for order, _ in pairs],
+            "results": [result for _, result in pairs]
+        }
+        with self._space:
+            self._space.notify_all()
+
+        try:
+            self._file.write(_dumps(batch) + b"\n")
+            self._file.flush()
+            self._unsynced = True
+            if self.durability == "batch" or time.monotonic() - self._last_fsync >= self.fsync_interval:
+                self._fsync()
+        except OSError as e:
+            self.errors += 1
+            self.last_error = str(e)
+            return
+        self.written += len(pairs)
+        self.batches += 1
+
+    def _fsync(self):
+        try:
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            self.errors += 1
+            self.last_error = str(e)
+            return
+        self._last_fsync = time.monotonic()
+        self._unsynced = False
+        self.fsyncs += 1
+
+    def close(self):
+        # Drain the queue, fsync and stop the writer
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        with self._space:
+            self._space.notify_all()
+        self._thread.join()
+        self._thread = None
+        if self._unsynced:
+            self._fsync()
+        self._file.close()
+        self._file = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "path": self.path or None,
+            "durability": self.durability,
+            "overflow": self.overflow,
+            "queue_depth": len(self._queue),
+            "max_queue": self.max_queue,
+            "written": self.written,
+            "dropped": self.dropped,
+            "blocked": self.blocked,
+            "batches": self.batches,
+            "avg_batch_size": round(self.written / self.batches, 2) if self.batches else 0.0,
+            "fsyncs": self.fsyncs,
+            "errors": self.errors,
+            "last_error": self.last_error
+        }
+
+
+audit_log = AuditWriter(
+    path=os.environ.get("PRICING_AUDIT_LOG", ""),
+    max_queue=int(os.environ.get("PRICING_AUDIT_QUEUE", "100000")),
+    max_batch=int(os.environ.get("PRICING_AUDIT_BATCH", "10000")),
+    durability=os.environ.get("PRICING_AUDIT_DURABILITY", "batch"),
+    fsync_interval_ms=float(os.environ.get("PRICING_AUDIT_FSYNC_MS", "1000")),
+    overflow=os.environ.get("PRICING_AUDIT_OVERFLOW", "block")
+)
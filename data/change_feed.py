@@ -0,0 +1,85 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+
+class ChangeFeed:
+    # Sequenced log of catalog and pricing rule changes, holding the most recent `capacity`
+    # events. Readers that fall further behind than that are told to resynchronize.
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._events = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._waiters = set()  # (loop, asyncio.Event) of readers waiting for new events
+        self._listeners = []   # Called with (events, generation) on every publish
+        self.last_seq = 0
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def publish(self, events: list, generation: int):
+        # events: [(type, data)], all produced by one store mutation
+        if not events:
+            return
+        for listener in self._listeners:
+            listener(events, generation)
+        timestamp = time.time()
+        with self._lock:
+            for event_type, data in events:
+                self.last_seq += 1
+                self._events.append({
+                    "seq": self.last_seq,
+                    "type": event_type,
+                    "generation": generation,
+                    "timestamp": timestamp,
+                    "data": data
+                })
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def read(self, after: int, limit: int) -> tuple:
+        # Returns (events with seq > after, resync) where resync is True when events
+        # after `after` have already been dropped and the reader must refetch the catalog
+        with self._lock:
+            if after >= self.last_seq:
+                return [], False
+            oldest = self._events[0]["seq"] if self._events else self.last_seq + 1
+            if after < oldest - 1:
+                return [], True
+            start = after - oldest + 1
+            return list(islice(self._events, start, start + limit)), False
+
+    async def wait(self, after: int, timeout: float) -> bool:
+        # Wait until an event with seq > after exists; False on timeout
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        with self._lock:
+            if self.last_seq > after:
+                return True
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "last_seq": self.last_seq,
+                "oldest_seq": self._events[0]["seq"] if self._events else None,
+                "retained": len(self._events),
+                "capacity": self.capacity,
+                "waiting_readers": len(self._waiters)
+            }
+
+
+change_feed = ChangeFeed(capacity=int(os.environ.get("PRICING_CHANGE_FEED_SIZE", "10000")))
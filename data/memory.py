@@ -1,5 +1,7 @@
 import sys
 import os
+import threading
+from bisect import bisect_left, bisect_right, insort
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
@@ -8,6 +10,8 @@ from models.product import Product
 from price_hierarchy.loyalty_prices import LoyaltyPrices
 from price_hierarchy.tiered_prices import TieredPrices
 from price_hierarchy.group_prices import GroupedPrices
+from data.change_feed import change_feed
+from data.audit_log import audit_log
 
 
 class Memory:
@@ -16,6 +20,54 @@ class Memory:
     products = []   # Type will be - [[Product, TierPrices, GroupPrices]]
     orders = []     # Type will be - [{"customer_id": , "product_id": , "quantity": }]
     results = []    # Type will be - [{"product_id": , "price":, "price_type"}]
+    history = []    # Type will be - [(order, result)], one record per priced order
+    generation = 0  # Bumped on every customer, product or pricing rule change
+    
+    # Secondary indexes over history: key -> ascending history positions. Every record holds
+    # an order together with its own result, so filters on either side select the same pairs.
+    _history_lock = threading.Lock()
+    _history_indexed = 0
+    _history_by_customer = {}
+    _history_by_product = {}
+    _history_by_price_type = {}
+    
+    # Secondary index over customers: (tier, group) -> ascending customer ids, with None as the
+    # wildcard, so (None, None) holds every id. Kept up to date by every customer mutation;
+    # the first customer with an id wins.
+    _customers_by_id = {}
+    _customer_ids_by_filter = {}
+    
+    # Field that identifies a rule within its owner's rule list, per rule kind
+    RULE_KEYS = {"tier": "tier", "group": "group", "loyalty": "product_id"}
+    
+    @classmethod
+    def _mark_changed(cls, events: list = ()):
+
+        # Bump the generation and publish the change events ([(type, data)]) of this mutation
+        cls.generation += 1
+        change_feed.publish(events, cls.generation)
+    
+    @staticmethod
+    def _customer_event_data(customer_data):
+        customer, loyalty_prices = customer_data
+        return {
+            "customer_id": customer.customer_id,
+            "name": customer.name,
+            "tier": customer.tier.value,
+            "groups": [group.value for group in customer.groups],
+            "loyalty_prices": list(loyalty_prices)
+        }
+    
+    @staticmethod
+    def _product_event_data(product_data):
+        product, tier_prices, group_prices = product_data
+        return {
+            "product_id": product.product_id,
+            "name": product.name,
+            "base_price": product.base_price,
+            "tier_prices": list(tier_prices),
+            "group_prices": list(group_prices)
+        }
     
     @classmethod
     def add_customer_with_loyalty(cls, customer: Customer, loyalty_prices: list = None):
@@ -23,6 +75,8 @@ class Memory:
         if loyalty_prices is None:
             loyalty_prices = []
         cls.customers.append([customer, loyalty_prices])
+        cls._index_customer(cls.customers[-1])
+        cls._mark_changed([("customer.created", cls._customer_event_data(cls.customers[-1]))])
     
     @classmethod
     def add_product_with_pricing(cls, product: Product, tier_prices: list = None, group_prices: list = None):
@@ -32,6 +86,192 @@ class Memory:
         if group_prices is None:
             group_prices = []
         cls.products.append([product, tier_prices, group_prices])
+        cls._mark_changed([("product.created", cls._product_event_data(cls.products[-1]))])
+    
+    @classmethod
+    def update_product(cls, product_id: int, name: str = None, base_price: float = None):
+
+        product, tier_prices, group_prices = cls.get_product_by_id(product_id)
+        events = []
+        if name is not None and name != product.name:
+            events.append(("product.renamed", {"product_id": product_id, "old_name": product.name, "name": name}))
+            product.name = name
+        if base_price is not None and base_price != product.base_price:
+            events.append(("product.base_price_changed", {
+                "product_id": product_id, "old_base_price": product.base_price, "base_price": base_price
+            }))
+            product.base_price = base_price
+        if events:
+            cls._mark_changed(events)
+    
+    @classmethod
+    def delete_customer(cls, customer_id: int):
+
+        remaining = [c for c in cls.customers if c[0].customer_id != customer_id]
+        removed = len(cls.customers) - len(remaining)
+        cls.customers = remaining
+        cls._unindex_customer(customer_id)
+        cls._mark_changed([("customer.deleted", {"customer_id": customer_id})] if removed else [])
+    
+    @staticmethod
+    def _customer_filter_keys(customer: Customer):
+        keys = {(None, None), (customer.tier.value, None)}
+        for group in customer.groups:
+            keys.add((None, group.value))
+            keys.add((customer.tier.value, group.value))
+        return keys
+    
+    @classmethod
+    def _index_customer(cls, customer_data):
+
+        customer = customer_data[0]
+        if customer.customer_id in cls._customers_by_id:
+            return
+        cls._customers_by_id[customer.customer_id] = customer_data
+        for key in cls._customer_filter_keys(customer):
+            insort(cls._customer_ids_by_filter.setdefault(key, []), customer.customer_id)
+    
+    @classmethod
+    def _unindex_customer(cls, customer_id: int):
+
+        customer_data = cls._customers_by_id.pop(customer_id, None)
+        if customer_data is None:
+            return
+        for key in cls._customer_filter_keys(customer_data[0]):
+            ids = cls._customer_ids_by_filter[key]
+            del ids[bisect_left(ids, customer_id)]
+    
+    @classmethod
+    def _reset_customer_indexes(cls):
+        cls._customers_by_id = {}
+        cls._customer_ids_by_filter = {}
+    
+    @classmethod
+    def query_customers(cls, tier: str = None, group: str = None, after: int = 0, limit: int = 100):
+
+        # Return up to `limit` customers with ids greater than `after`, in ascending id order,
+        # that are in the given tier and group (tier / group values, None for any). Answered
+        # by slicing one index list, so a page costs its own size, not the number of customers.
+        ids = cls._customer_ids_by_filter.get((tier, group), [])
+        start = bisect_right(ids, after)
+        return [cls._customers_by_id[customer_id] for customer_id in ids[start:start + limit]]
+    
+    @classmethod
+    def delete_product(cls, product_id: int):
+
+        remaining = [p for p in cls.products if p[0].product_id != product_id]
+        removed = len(cls.products) - len(remaining)
+        cls.products = remaining
+        cls._mark_changed([("product.deleted", {"product_id": product_id})] if removed else [])
+    
+    @classmethod
+    def add_tier_price(cls, product_id: int, tier_rule: dict):
+
+        product, tier_prices, group_prices = cls.get_product_by_id(product_id)
+        tier_prices.append(tier_rule)
+        cls._mark_changed([("rule.upserted", {"kind": "tier", "rule": tier_rule})])
+    
+    @classmethod
+    def add_group_price(cls, product_id: int, group_rule: dict):
+
+        product, tier_prices, group_prices = cls.get_product_by_id(product_id)
+        group_prices.append(group_rule)
+        cls._mark_changed([("rule.upserted", {"kind": "group", "rule": group_rule})])
+    
+    @classmethod
+    def add_loyalty_price(cls, customer_id: int, loyalty_rule: dict):
+
+        customer, loyalty_prices = cls.get_customer_by_id(customer_id)
+        loyalty_prices.append(loyalty_rule)
+        cls._mark_changed([("rule.upserted", {"kind": "loyalty", "rule": loyalty_rule})])
+    
+    @classmethod
+    def apply_rule_changes(cls, changes: list, atomic: bool = True):
+
+        # Apply a changeset of {"op": "upsert"|"delete", "kind": "tier"|"group"|"loyalty", "rule": {...}}
+        # with a single generation bump. Changes that already carry an "error" fail without being
+        # looked at. Returns one outcome dict per change; when atomic, nothing is applied unless
+        # every change is valid.
+        products_by_id = {product_data[0].product_id: product_data for product_data in cls.products}
+        customers_by_id = {customer_data[0].customer_id: customer_data for customer_data in cls.customers}
+        
+        # Resolve the owner row and rule-list slot of every change before touching anything
+        targets = []
+        outcomes = []
+        for change in changes:
+            error = change.get("error")
+            target = None
+            if error is None:
+                rule = change["rule"]
+                if change["kind"] == "loyalty":
+                    owner = customers_by_id.get(rule["customer_id"])
+                    if owner is None:
+                        error = f"Customer {rule['customer_id']} not found"
+                    elif rule["product_id"] not in products_by_id:
+                        error = f"Product {rule['product_id']} not found"
+                    else:
+                        target = (owner, 1)
+                else:
+                    owner = products_by_id.get(rule["product_id"])
+                    if owner is None:
+                        error = f"Product {rule['product_id']} not found"
+                    else:
+                        target = (owner, 1 if change["kind"] == "tier" else 2)
+            targets.append(target)
+            outcomes.append({"status": "error", "error": error} if error else None)
+        
+        if atomic and any(outcome is not None for outcome in outcomes):
+            return [outcome or {"status": "skipped"} for outcome in outcomes]
+        
+        # Touched rule lists are edited as copies and swapped in at the end, so pricing running
+        # on other threads keeps a consistent view of the lists it already holds
+        working = {}  # id(owner row) + slot -> [owner, slot, rules copy, key -> position]
+        events = []
+        for index, (change, target) in enumerate(zip(changes, targets)):
+            if target is None:
+                continue
+            owner, slot = target
+            entry = working.get((id(owner), slot))
+            if entry is None:
+                key_field = cls.RULE_KEYS[change["kind"]]
+                rules = list(owner[slot])
+                entry = working[(id(owner), slot)] = [
+                    owner, slot, rules, {rule[key_field]: position for position, rule in enumerate(rules)}
+                ]
+            rules, positions = entry[2], entry[3]
+            
+            rule = change["rule"]
+            key = rule[cls.RULE_KEYS[change["kind"]]]
+            position = positions.get(key)
+            existing = rules[position] if position is not None else None
+            if change["op"] == "delete":
+                if existing is None:
+                    outcomes[index] = {"status": "not_found"}
+                else:
+                    rules[position] = None
+                    outcomes[index] = {"status": "deleted"}
+                    events.append(("rule.deleted", {"kind": change["kind"], "rule": existing}))
+                continue
+            if existing is None:
+                if position is None:
+                    positions[key] = len(rules)
+                    rules.append(rule)
+                else:
+                    rules[position] = rule
+                outcomes[index] = {"status": "created"}
+            elif existing == rule:
+                outcomes[index] = {"status": "unchanged"}
+                continue
+            else:
+                rules[position] = rule
+                outcomes[index] = {"status": "updated"}
+            events.append(("rule.upserted", {"kind": change["kind"], "rule": rule}))
+        
+        for owner, slot, rules, positions in working.values():
+            owner[slot] = [rule for rule in rules if rule is not None]
+        if events:
+            cls._mark_changed(events)
+        return outcomes
     
     @classmethod
     def add_order(cls, customer_id: int, product_id: int, quantity: int):
@@ -53,6 +293,101 @@ class Memory:
         }
         cls.results.append(result)
     
+    @classmethod
+    def add_order_result(cls, customer_id: int, product_id: int, quantity: int, result: dict):
+
+        # Append an order and its result as one history record, under the history lock
+        order = {
+            "customer_id": customer_id,
+            "product_id": product_id,
+            "quantity": quantity
+        }
+        stored = {
+            "product_id": result["product_id"],
+            "price": result["price"],
+            "price_type": result["price_type"]
+        }
+        with cls._history_lock:
+            cls.orders.append(order)
+            cls.results.append(stored)
+            cls.history.append((order, stored))
+        audit_log.add(order, stored)
+    
+    @classmethod
+    def add_order_results(cls, orders, results):
+
+        # add_order_result for a priced batch ([order dict], [result]), under one lock acquisition
+        pairs = [
+            ({"customer_id": order["customer_id"], "product_id": order["product_id"], "quantity": order["quantity"]},
+             {"product_id": result["product_id"], "price": result["price"], "price_type": result["price_type"]})
+            for order, result in zip(orders, results)
+        ]
+        with cls._history_lock:
+            for order, stored in pairs:
+                cls.orders.append(order)
+                cls.results.append(stored)
+            cls.history.extend(pairs)
+        for order, stored in pairs:
+            audit_log.add(order, stored)
+    
+    @classmethod
+    def _sync_history_indexes(cls):
+
+        # Index records appended since the last call; start over if the history was cleared
+        if len(cls.history) < cls._history_indexed:
+            cls._reset_history_indexes()
+        
+        history_count = len(cls.history)
+        for position in range(cls._history_indexed, history_count):
+            order, result = cls.history[position]
+            price_type = result["price_type"]
+            cls._history_by_customer.setdefault(order["customer_id"], []).append(position)
+            cls._history_by_product.setdefault(order["product_id"], []).append(position)
+            cls._history_by_price_type.setdefault(getattr(price_type, "value", price_type), []).append(position)
+        cls._history_indexed = history_count
+    
+    @classmethod
+    def _reset_history_indexes(cls):
+        cls._history_indexed = 0
+        cls._history_by_customer = {}
+        cls._history_by_product = {}
+        cls._history_by_price_type = {}
+    
+    @classmethod
+    def query_history(cls, after: int = 0, limit: int = 100, customer_id: int = None,
+                      product_id: int = None, price_type: str = None):
+
+        # Return up to `limit` ascending 1-based history ids greater than `after` whose record
+        # matches every given filter. Scans only the smallest matching index list.
+        with cls._history_lock:
+            cls._sync_history_indexes()
+            
+            candidates = []
+            if customer_id is not None:
+                candidates.append(cls._history_by_customer.get(customer_id, []))
+            if product_id is not None:
+                candidates.append(cls._history_by_product.get(product_id, []))
+            if price_type is not None:
+                candidates.append(cls._history_by_price_type.get(price_type, []))
+            
+            if not candidates:
+                return list(range(after + 1, min(after + limit, len(cls.history)) + 1))
+            
+            positions = min(candidates, key=len)
+            matches = []
+            for position in positions[bisect_left(positions, after):]:
+                order, result = cls.history[position]
+                if customer_id is not None and order["customer_id"] != customer_id:
+                    continue
+                if product_id is not None and order["product_id"] != product_id:
+                    continue
+                if price_type is not None and getattr(result["price_type"], "value", result["price_type"]) != price_type:
+                    continue
+                matches.append(position + 1)
+                if len(matches) >= limit:
+                    break
+            return matches
+    
     @classmethod
     def get_customer_by_id(cls, customer_id: int):
 
@@ -71,6 +406,30 @@ class Memory:
                 return product_data
         return None
     
+    @classmethod
+    def get_customers_by_ids(cls, customer_ids):
+
+        # {customer_id: customer_data} for the ids that exist, in one pass over the store
+        wanted = set(customer_ids)
+        found = {}
+        for customer_data in cls.customers:
+            customer_id = customer_data[0].customer_id
+            if customer_id in wanted and customer_id not in found:
+                found[customer_id] = customer_data
+        return found
+    
+    @classmethod
+    def get_products_by_ids(cls, product_ids):
+
+        # {product_id: product_data} for the ids that exist, in one pass over the store
+        wanted = set(product_ids)
+        found = {}
+        for product_data in cls.products:
+            product_id = product_data[0].product_id
+            if product_id in wanted and product_id not in found:
+                found[product_id] = product_data
+        return found
+    
     @classmethod
     def get_all_customers(cls):
 
@@ -164,7 +523,12 @@ class Memory:
     @classmethod
     def clear_all(cls):
         cls.customers.clear()
+        cls._reset_customer_indexes()
         cls.products.clear()
-        cls.orders.clear()
-        cls.results.clear()
+        with cls._history_lock:
+            cls.orders.clear()
+            cls.results.clear()
+            cls.history.clear()
+            cls._reset_history_indexes()
+        cls._mark_changed([("catalog.cleared", {})])
         print("All data cleared from memory.")
\ No newline at end of file
@@ -9,20 +9,25 @@ import time
 import threading
 import sys
 import os
-import requests
 from pathlib import Path
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.pricing_client import PricingClient
+
 class IntegrationManager:
     def __init__(self):
         self.api_process = None
         self.gui_process = None
         self.api_running = False
+        # Health checks poll while the server starts up, so they must fail fast rather than retry
+        self.client = PricingClient("http://localhost:8000", retries=0)
         
     def check_api_health(self, retries=10, delay=1):
         """Check if API server is healthy"""
         for i in range(retries):
             try:
-                response = requests.get("http://localhost:8000/health", timeout=2)
+                response = self.client.get("/health", timeout=2)
                 if response.status_code == 200:
                     return True
             except:
@@ -103,7 +108,7 @@ class IntegrationManager:
         # Load sample data
         print("📊 Loading sample data...")
         try:
-            response = requests.post("http://localhost:8000/load-sample-data")
+            response = self.client.post("/load-sample-data")
             if response.status_code == 200:
                 print("✅ Sample data loaded successfully")
             else:
@@ -5,11 +5,16 @@ A Tkinter-based interface to interact with the pricing engine REST API
 
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import requests
 import json
+import os
+import sys
 from typing import Dict, Any
 import threading
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from client.pricing_client import PricingClient
+
 class PricingEngineGUI:
     def __init__(self, root):
         self.root = root
@@ -19,6 +24,7 @@ class PricingEngineGUI:
         
         # API Configuration
         self.api_base_url = "http://localhost:8000"
+        self.client = PricingClient(self.api_base_url)
         
         # Create main interface
         self.setup_ui()
@@ -366,7 +372,7 @@ class PricingEngineGUI:
         """Check if API is accessible"""
         def check():
             try:
-                response = requests.get(f"{self.api_base_url}/health", timeout=5)
+                response = self.client.get("/health", timeout=5)
                 if response.status_code == 200:
                     self.status_label.config(text="✅ API Connected - Ready", fg="green")
                 else:
@@ -379,7 +385,7 @@ class PricingEngineGUI:
     def check_health(self):
         """Check API health"""
         try:
-            response = requests.get(f"{self.api_base_url}/health")
+            response = self.client.get("/health")
             result = f"Health Check Result:\nStatus: {response.status_code}\nResponse: {json.dumps(response.json(), indent=2)}\n\n"
             self.system_info_text.insert(tk.END, result)
             self.system_info_text.see(tk.END)
@@ -389,7 +395,7 @@ class PricingEngineGUI:
     def get_status(self):
         """Get system status"""
         try:
-            response = requests.get(f"{self.api_base_url}/status")
+            response = self.client.get("/status")
             result = f"System Status:\nStatus: {response.status_code}\nResponse: {json.dumps(response.json(), indent=2)}\n\n"
             self.system_info_text.insert(tk.END, result)
             self.system_info_text.see(tk.END)
@@ -399,7 +405,7 @@ class PricingEngineGUI:
     def load_sample_data(self):
         """Load sample data via API"""
         try:
-            response = requests.post(f"{self.api_base_url}/load-sample-data")
+            response = self.client.post("/load-sample-data")
             if response.status_code == 200:
                 messagebox.showinfo("Success", "Sample data loaded successfully!")
                 self.load_customers()
@@ -413,7 +419,7 @@ class PricingEngineGUI:
         """Clear all data via API"""
         if messagebox.askyesno("Confirm", "Are you sure you want to clear all data?"):
             try:
-                response = requests.delete(f"{self.api_base_url}/clear-data")
+                response = self.client.delete("/clear-data")
                 if response.status_code == 200:
                     messagebox.showinfo("Success", "All data cleared successfully!")
                     self.load_customers()
@@ -439,7 +445,7 @@ class PricingEngineGUI:
                 "groups": groups
             }
             
-            response = requests.post(f"{self.api_base_url}/customers", json=customer_data)
+            response = self.client.post("/customers", json=customer_data)
             if response.status_code == 200:
                 messagebox.showinfo("Success", "Customer created successfully!")
                 self.clear_customer_form()
@@ -452,7 +458,7 @@ class PricingEngineGUI:
     def load_customers(self):
         """Load customers from API"""
         try:
-            response = requests.get(f"{self.api_base_url}/customers")
+            response = self.client.get("/customers")
             if response.status_code == 200:
                 customers = response.json()
                 
@@ -491,7 +497,7 @@ class PricingEngineGUI:
                 "base_price": float(self.product_price_var.get())
             }
             
-            response = requests.post(f"{self.api_base_url}/products", json=product_data)
+            response = self.client.post("/products", json=product_data)
             if response.status_code == 200:
                 messagebox.showinfo("Success", "Product created successfully!")
                 self.clear_product_form()
@@ -504,7 +510,7 @@ class PricingEngineGUI:
     def load_products(self):
         """Load products from API"""
         try:
-            response = requests.get(f"{self.api_base_url}/products")
+            response = self.client.get("/products")
             if response.status_code == 200:
                 products = response.json()
                 
@@ -542,7 +548,7 @@ class PricingEngineGUI:
             }
             
             product_id = rule_data["product_id"]
-            response = requests.post(f"{self.api_base_url}/products/{product_id}/tier-prices", json=rule_data)
+            response = self.client.post(f"/products/{product_id}/tier-prices", json=rule_data)
             if response.status_code == 200:
                 messagebox.showinfo("Success", "Tier pricing rule added successfully!")
                 # Clear form
@@ -565,7 +571,7 @@ class PricingEngineGUI:
             }
             
             product_id = rule_data["product_id"]
-            response = requests.post(f"{self.api_base_url}/products/{product_id}/group-prices", json=rule_data)
+            response = self.client.post(f"/products/{product_id}/group-prices", json=rule_data)
             if response.status_code == 200:
                 messagebox.showinfo("Success", "Group pricing rule added successfully!")
                 # Clear form
@@ -588,7 +594,7 @@ class PricingEngineGUI:
             }
             
             customer_id = rule_data["customer_id"]
-            response = requests.post(f"{self.api_base_url}/customers/{customer_id}/loyalty-prices", json=rule_data)
+            response = self.client.post(f"/customers/{customer_id}/loyalty-prices", json=rule_data)
             if response.status_code == 200:
                 messagebox.showinfo("Success", "Loyalty pricing rule added successfully!")
                 # Clear form
@@ -611,7 +617,7 @@ class PricingEngineGUI:
                 "quantity": int(self.calc_quantity_var.get())
             }
             
-            response = requests.post(f"{self.api_base_url}/calculate-price", json=order_data)
+            response = self.client.post("/calculate-price", json=order_data)
             if response.status_code == 200:
                 result = response.json()
                 result_text = f"""
@@ -641,23 +647,22 @@ Result:
         try:
             method = self.api_method_var.get()
             endpoint = self.api_endpoint_var.get()
-            url = f"{self.api_base_url}{endpoint}"
             
             if method == "GET":
-                response = requests.get(url)
+                response = self.client.get(endpoint)
             elif method == "POST":
                 payload = self.payload_text.get(1.0, tk.END).strip()
                 if payload:
                     json_data = json.loads(payload)
-                    response = requests.post(url, json=json_data)
+                    response = self.client.post(endpoint, json=json_data)
                 else:
-                    response = requests.post(url)
+                    response = self.client.post(endpoint)
             elif method == "DELETE":
-                response = requests.delete(url)
+                response = self.client.delete(endpoint)
             
             # Display response
             response_text = f"""
-Request: {method} {url}
+Request: {method} {response.url}
 Status Code: {response.status_code}
 Response:
 {json.dumps(response.json() if response.headers.get('content-type', '').startswith('application/json') else response.text, indent=2)}
@@ -230,7 +230,7 @@ class Main:
                 "min_qty": min_qty
             }
             
-            tier_prices.append(tier_rule)
+            Memory.add_tier_price(product_id, tier_rule)
             print(f"Tier pricing rule added for {tier.value}!")
             
         except ValueError as e:
@@ -284,7 +284,7 @@ class Main:
                 "min_qty": min_qty
             }
             
-            group_prices.append(group_rule)
+            Memory.add_group_price(product_id, group_rule)
             print(f"Group pricing rule added for {group.value}!")
             
         except ValueError as e:
@@ -358,7 +358,7 @@ class Main:
                 "min_qty": min_qty
             }
             
-            loyalty_prices.append(loyalty_rule)
+            Memory.add_loyalty_price(customer_id, loyalty_rule)
             print("Loyalty pricing rule added successfully!")
             
         except ValueError:
@@ -1,10 +1,14 @@
 import sys
 import os
+from bisect import bisect_right
 
 from constants.price import PriceType
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# Orders priced between calls to a batch's should_stop callback
+STOP_CHECK_INTERVAL = 1000
+
 
 def find_all_applicable_prices_for_order(order: dict, products: list[dict], customers: list[dict]) -> dict:
 
@@ -62,47 +66,255 @@ def find_all_applicable_prices_for_order(order: dict, products: list[dict], cust
     }
 
 
-def find_best_applicable_price(orders: list[dict], products: list[dict], customers: list[dict]) -> list[dict]:
+def select_best_price(order: dict, price_options: dict) -> dict:
+
+    # To Collect all applicable prices with their types
+    applicable_prices = []
+    
+    if price_options["loyalty_price"] > 0:
+        applicable_prices.append((PriceType.CUSTOMER, price_options["loyalty_price"]))
+    
+    if price_options["tier_price"] > 0:
+        applicable_prices.append((PriceType.TIER, price_options["tier_price"]))
+
+    for group_price in price_options["group_prices"]:
+        applicable_prices.append((PriceType.GROUP, group_price["price"]))
+
+    applicable_prices.append((PriceType.NORMAL, price_options["base_price"]))
+
+    # Find the best price
+    best_price_type, best_price = min(applicable_prices, key=lambda x: x[1])
+    
+    # Format product ID as requested (P + zero-padded ID)
+    product_id_formatted = f"P{order['product_id']:03d}"
+    
+    return {
+        "product_id": product_id_formatted,
+        "price": best_price,
+        "price_type": best_price_type
+    }
+
+
+def error_result(order: dict) -> dict:
+
+    # Handle cases where product or customer not found
+    product_id_formatted = f"P{order['product_id']:03d}"
+    return {
+        "product_id": product_id_formatted,
+        "price": 0,
+        "price_type": "ERROR"
+    }
 
+
+def find_best_applicable_price(orders: list[dict], products: list[dict], customers: list[dict], should_stop=None) -> list[dict]:
+
+    # should_stop is called every STOP_CHECK_INTERVAL orders; when it returns True the
+    # results for the orders priced so far are returned
     results = []
     
-    for order in orders:
+    for index, order in enumerate(orders):
+        if should_stop is not None and index % STOP_CHECK_INTERVAL == 0 and should_stop():
+            break
         try:
             price_options = find_all_applicable_prices_for_order(order, products, customers)
+            results.append(select_best_price(order, price_options))
             
-            # To Collect all applicable prices with their types
-            applicable_prices = []
-            
-            if price_options["loyalty_price"] > 0:
-                applicable_prices.append((PriceType.CUSTOMER, price_options["loyalty_price"]))
-            
-            if price_options["tier_price"] > 0:
-                applicable_prices.append((PriceType.TIER, price_options["tier_price"]))
+        except ValueError as e:
+            results.append(error_result(order))
+    
+    return results
 
-            for group_price in price_options["group_prices"]:
-                applicable_prices.append((PriceType.GROUP, group_price["price"]))
 
-            applicable_prices.append((PriceType.NORMAL, price_options["base_price"]))
+def find_best_applicable_price_batch(orders: list[dict], products: list[dict], customers: list[dict], should_stop=None) -> list[dict]:
 
-            # Find the best price
-            best_price_type, best_price = min(applicable_prices, key=lambda x: x[1])
-            
-            # Format product ID as requested (P + zero-padded ID)
-            product_id_formatted = f"P{order['product_id']:03d}"
-            
-            results.append({
-                "product_id": product_id_formatted,
-                "price": best_price,
-                "price_type": best_price_type
-            })
+    # Same results as find_best_applicable_price, but products and customers are
+    # indexed by id once per batch instead of being scanned for every order.
+    # setdefault keeps the first entry per id, matching next() in the scan.
+    products_by_id = {}
+    for product in products:
+        products_by_id.setdefault(product["product_id"], [product])
+    customers_by_id = {}
+    for customer in customers:
+        customers_by_id.setdefault(customer["customer_id"], [customer])
+
+    results = []
+    
+    for index, order in enumerate(orders):
+        if should_stop is not None and index % STOP_CHECK_INTERVAL == 0 and should_stop():
+            break
+        try:
+            price_options = find_all_applicable_prices_for_order(
+                order,
+                products_by_id.get(order["product_id"], []),
+                customers_by_id.get(order["customer_id"], [])
+            )
+            results.append(select_best_price(order, price_options))
             
-        except ValueError as e:
-            # Handle cases where product or customer not found
-            product_id_formatted = f"P{order['product_id']:03d}"
-            results.append({
-                "product_id": product_id_formatted,
-                "price": 0,
-                "price_type": "ERROR"
-            })
+        except ValueError:
+            results.append(error_result(order))
+    
+    return results
+
+
+def find_price_breakpoints(customer_id: int, product_id: int, products: list[dict], customers: list[dict]) -> tuple[list[int], list[dict]]:
+
+    # Best price only changes where a rule's min_qty is reached, so evaluate each
+    # threshold once. Returns ascending quantities and the result that applies from
+    # each quantity up to the next one; quantities below the first share its result.
+    product = next((p for p in products if p["product_id"] == product_id), None)
+    customer = next((c for c in customers if c["customer_id"] == customer_id), None)
+
+    thresholds = set()
+    if product:
+        thresholds.update(tp["min_qty"] for tp in product.get("tier_prices", []))
+        thresholds.update(gp["min_qty"] for gp in product.get("group_prices", []))
+    if customer:
+        thresholds.update(lp["min_qty"] for lp in customer.get("loyalty_products", []) if lp["product_id"] == product_id)
+
+    quantities = sorted(thresholds)
+    quantities.insert(0, quantities[0] - 1 if quantities else 0)
+
+    results = []
+    for quantity in quantities:
+        order = {"customer_id": customer_id, "product_id": product_id, "quantity": quantity}
+        try:
+            price_options = find_all_applicable_prices_for_order(order, products, customers)
+            results.append(select_best_price(order, price_options))
+        except ValueError:
+            results.append(error_result(order))
+
+    return quantities, results
+
+
+def find_best_applicable_price_columns(customer_ids, product_ids, quantities, products: list[dict], customers: list[dict], should_stop=None) -> list[dict]:
+
+    # Column-oriented pricing: each distinct customer/product pair is priced once per
+    # rule threshold, then every order is a bisect into that pair's breakpoints.
+    # Returned result dicts are shared between orders and must not be mutated.
+    products_by_id = {}
+    for product in products:
+        products_by_id.setdefault(product["product_id"], [product])
+    customers_by_id = {}
+    for customer in customers:
+        customers_by_id.setdefault(customer["customer_id"], [customer])
+
+    breakpoints = {}
+    results = []
     
-    return results
\ No newline at end of file
+    for index, (customer_id, product_id, quantity) in enumerate(zip(customer_ids, product_ids, quantities)):
+        if should_stop is not None and index % STOP_CHECK_INTERVAL == 0 and should_stop():
+            break
+        pair = (customer_id, product_id)
+        pair_breakpoints = breakpoints.get(pair)
+        if pair_breakpoints is None:
+            pair_breakpoints = find_price_breakpoints(
+                customer_id,
+                product_id,
+                products_by_id.get(product_id, []),
+                customers_by_id.get(customer_id, [])
+            )
+            breakpoints[pair] = pair_breakpoints
+        
+        pair_quantities, pair_results = pair_breakpoints
+        results.append(pair_results[max(bisect_right(pair_quantities, quantity) - 1, 0)])
+    
+    return results
+
+
+class PriceLookup:
+
+    # Best prices for single orders against one catalog snapshot. Like the column path, each
+    # customer/product pair is priced once per rule threshold on first use, and every order
+    # after that is a dict lookup and a bisect. Returned result dicts are shared between
+    # orders and must not be mutated.
+
+    def __init__(self, products: list[dict], customers: list[dict]):
+        self.products_by_id = {}
+        for product in products:
+            self.products_by_id.setdefault(product["product_id"], [product])
+        self.customers_by_id = {}
+        for customer in customers:
+            self.customers_by_id.setdefault(customer["customer_id"], [customer])
+        self.breakpoints = {}  # (customer_id, product_id) -> (quantities, results)
+
+    def pair_breakpoints(self, customer_id: int, product_id: int) -> tuple:
+        pair = (customer_id, product_id)
+        pair_breakpoints = self.breakpoints.get(pair)
+        if pair_breakpoints is None:
+            pair_breakpoints = self.breakpoints[pair] = find_price_breakpoints(
+                customer_id,
+                product_id,
+                self.products_by_id.get(product_id, []),
+                self.customers_by_id.get(customer_id, [])
+            )
+        return pair_breakpoints
+
+    def price(self, customer_id: int, product_id: int, quantity: int) -> dict:
+        pair_quantities, pair_results = self.pair_breakpoints(customer_id, product_id)
+        return pair_results[max(bisect_right(pair_quantities, quantity) - 1, 0)]
+
+
+class PriceSummary:
+
+    # Running totals of best prices for orders that are priced but never returned one by one:
+    # per price type (and "ERROR" for unknown products or customers) the number of orders, the
+    # quantity, the revenue (price * quantity) and the discount ((base price - price) * quantity).
+    # Breakpoints come from a PriceLookup, so add() can be fed any number of chunks cheaply.
+    PRICE_TYPES = [price_type.value for price_type in PriceType] + ["ERROR"]
+
+    def __init__(self, products: list[dict], customers: list[dict]):
+        self.lookup = PriceLookup(products, customers)
+        self.breakpoints = {}  # (customer_id, product_id) -> (quantities, [(price type, price, unit discount)])
+        self.totals = {price_type: [0, 0, 0, 0] for price_type in self.PRICE_TYPES}  # orders, quantity, revenue, discount
+
+    def _pair_breakpoints(self, customer_id: int, product_id: int) -> tuple:
+        products = self.lookup.products_by_id.get(product_id, [])
+        quantities, results = self.lookup.pair_breakpoints(customer_id, product_id)
+        base_price = products[0]["base_price"] if products else 0
+        prices = []
+        for result in results:
+            price_type = getattr(result["price_type"], "value", result["price_type"])
+            if price_type == "ERROR":
+                prices.append((price_type, 0, 0))
+            else:
+                prices.append((price_type, result["price"], base_price - result["price"]))
+        return quantities, prices
+
+    def add(self, orders: list[dict], should_stop=None) -> int:
+
+        # Same stop contract as find_best_applicable_price; returns the number of orders added
+        totals = self.totals
+        breakpoints = self.breakpoints
+        for index, order in enumerate(orders):
+            if should_stop is not None and index % STOP_CHECK_INTERVAL == 0 and should_stop():
+                return index
+            pair = (order["customer_id"], order["product_id"])
+            pair_breakpoints = breakpoints.get(pair)
+            if pair_breakpoints is None:
+                pair_breakpoints = breakpoints[pair] = self._pair_breakpoints(*pair)
+            
+            pair_quantities, pair_prices = pair_breakpoints
+            quantity = order["quantity"]
+            price_type, price, discount = pair_prices[max(bisect_right(pair_quantities, quantity) - 1, 0)]
+            entry = totals[price_type]
+            entry[0] += 1
+            entry[1] += quantity
+            entry[2] += price * quantity
+            entry[3] += discount * quantity
+        return len(orders)
+
+    def price_type_counts(self) -> dict:
+        return {price_type: entry[0] for price_type, entry in self.totals.items() if entry[0]}
+
+    def to_dict(self) -> dict:
+        by_price_type = {
+            price_type: {"orders": orders, "quantity": quantity, "revenue": round(revenue, 2), "discount": round(discount, 2)}
+            for price_type, (orders, quantity, revenue, discount) in self.totals.items()
+        }
+        return {
+            "orders": sum(entry["orders"] for entry in by_price_type.values()),
+            "quantity": sum(entry["quantity"] for entry in by_price_type.values()),
+            "revenue": round(sum(entry[2] for entry in self.totals.values()), 2),
+            "discount": round(sum(entry[3] for entry in self.totals.values()), 2),
+            "by_price_type": by_price_type
+        }